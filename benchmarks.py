@@ -0,0 +1,207 @@
+"""Micro-benchmarks for the detection hot path
+
+Times the pieces of the per-frame path on fixed synthetic frames and the
+shipped regions.json, so runs on the same machine are comparable:
+
+    check_box_in_roi    boxes inside / outside / straddling the ROI (mask only, and with the
+                        region index when the detector would use one for the mask)
+    build_mask          rasterizing every mask model at the capture resolution
+    overlay             FrameRenderer.apply_overlay
+    process_frame       stub model returning fixed synthetic boxes
+    screenshot          JPEG encode and write of an overlaid frame, as take_screenshot does
+    serial              send_command write, and write -> fake Arduino receive (pty, POSIX only)
+
+    python benchmarks.py --json bench.json
+    python benchmarks.py --save-baseline benchmarks_baseline.json
+    python benchmarks.py --baseline benchmarks_baseline.json --tolerance 0.25
+
+With --baseline, each benchmark's median is compared with the stored one and
+the exit status is 1 if any is slower by more than --tolerance.
+"""
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+import cv2
+import numpy as np
+
+import yolo11n_arduino as detector
+
+def _frame(width, height, seed=0):
+    # fixed noise with a few solid shapes, identical on every run
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+    for i in range(6):
+        x, y = int(width * (0.1 + 0.13 * i)), int(height * (0.2 + 0.1 * (i % 3)))
+        cv2.rectangle(frame, (x, y), (x + width // 12, y + height // 8), (30 * i, 200, 255 - 30 * i), -1)
+    return frame
+
+def _boxes(mask, size, seed=0):
+    """Fixed boxes that fall inside, outside and across the ROI boundary"""
+    h, w = mask.shape
+    rng = np.random.default_rng(seed)
+    inside, outside, straddle = [], [], []
+    for _ in range(5000):
+        x1 = int(rng.integers(0, w - size))
+        y1 = int(rng.integers(0, h - size))
+        box = (x1, y1, x1 + size, y1 + size)
+        frac = np.count_nonzero(mask[y1:y1 + size, x1:x1 + size]) / (size * size)
+        group = inside if frac == 1.0 else outside if frac == 0.0 else straddle
+        if len(group) < 20:
+            group.append(box)
+    return {'inside': inside, 'outside': outside, 'straddle': straddle}
+
+def _time(fn, repeat, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    a = np.asarray(samples) * 1e6
+    return {'repeat': repeat, 'median_us': float(np.median(a)), 'p95_us': float(np.percentile(a, 95)),
+            'min_us': float(a.min()), 'mean_us': float(a.mean())}
+
+def run(args):
+    with open(args.regions, 'r') as f:
+        data = json.load(f)
+    mask_name = args.mask or next(iter(data))
+    width, height = args.width, args.height
+    entry = data[mask_name]
+    mask = detector.build_mask(entry, width, height)
+    # the detector only uses the index when the regions leave most of the frame clear
+    index = detector.region_index(entry, width, height)
+    if index is None:
+        coverage = detector.RegionIndex(entry, width, height).coverage
+        print(f"[Bench] Region index not used for {mask_name} (region bboxes cover {coverage:.0%} of the frame)")
+    frame = _frame(width, height, args.seed)
+    results = {}
+
+    def bench(name, fn, repeat=args.repeat):
+        results[name] = _time(fn, repeat)
+        r = results[name]
+        print(f"[Bench] {name:<32} median {r['median_us']:10.1f} us   p95 {r['p95_us']:10.1f} us")
+
+    # ROI check per box kind, without and with the region index
+    groups = _boxes(mask, args.box_size, args.seed)
+    for kind, boxes in groups.items():
+        if not boxes:
+            continue
+        bench(f'check_box_in_roi.{kind}', lambda b=boxes: [detector.check_box_in_roi(x, mask) for x in b])
+        if index is not None:
+            bench(f'check_box_in_roi.{kind}.indexed', lambda b=boxes: [detector.check_box_in_roi(x, mask, index) for x in b])
+
+    bench('build_mask', lambda: [detector.build_mask(e, width, height) for e in data.values()],
+          repeat=max(5, args.repeat // 10))
+
+    renderer = detector.FrameRenderer(width, height, display=False)
+    renderer.set_overlay(mask)
+    bench('overlay', lambda: renderer.apply_overlay(frame))
+
+    # stub model: fixed boxes in inference coordinates, no inference cost
+    from latency_harness import StubModel
+    infer_w, infer_h = detector.infer_size(width, height)
+    sx, sy = infer_w / width, infer_h / height
+    stub_boxes = [(x1 * sx, y1 * sy, x2 * sx, y2 * sy) for b in groups.values() for x1, y1, x2, y2 in b[:3]]
+    model = StubModel(fixed_boxes=stub_boxes)
+    annotated = np.empty_like(frame)
+    small = np.empty((infer_h, infer_w, 3), dtype=np.uint8)
+    bench('process_frame.stub', lambda: detector.process_frame(frame, mask, model, out=annotated, small=small, index=index))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'screenshot.jpg')
+        bench('screenshot.encode', lambda: cv2.imencode('.jpg', renderer.apply_overlay(frame)),
+              repeat=max(5, args.repeat // 5))
+        bench('screenshot.write', lambda: cv2.imwrite(path, renderer.apply_overlay(frame)),
+              repeat=max(5, args.repeat // 5))
+
+    if os.name == 'posix':
+        import serial
+        from latency_harness import FakeArduino
+        fake = FakeArduino().start()
+        port = serial.Serial(port=fake.port_name, baudrate=detector.config.baud_rate, timeout=1)
+        sig = ['1']
+
+        def write_only():
+            sig[0] = '0' if sig[0] == '1' else '1'
+            detector.send_command(port, sig[0], 200)
+
+        def round_trip():
+            sig[0] = '0' if sig[0] == '1' else '1'
+            t0 = time.perf_counter()
+            detector.send_command(port, sig[0], 200)
+            fake.wait_for_command(sig[0], since=t0)
+            port.reset_input_buffer()
+        try:
+            bench('serial.write', write_only, repeat=max(5, args.repeat // 5))
+            time.sleep(0.2)
+            port.reset_input_buffer()
+            bench('serial.round_trip', round_trip, repeat=max(5, args.repeat // 5))
+        finally:
+            port.close()
+            fake.close()
+    else:
+        print("[Bench] serial benchmarks skipped (pty needs POSIX)")
+
+    return {
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'opencv': cv2.__version__, 'cpus': os.cpu_count()},
+        'resolution': [width, height],
+        'mask': mask_name,
+        'results': results,
+    }
+
+def compare(report, baseline, tolerance):
+    """Return [(name, baseline_us, current_us, ratio)] for benchmarks slower than tolerance allows"""
+    regressions = []
+    for name, r in report['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = r['median_us'] / base['median_us'] if base['median_us'] else 1.0
+        flag = 'REGRESSION' if ratio > 1.0 + tolerance else ''
+        print(f"[Bench] {name:<32} {base['median_us']:10.1f} -> {r['median_us']:10.1f} us  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append((name, base['median_us'], r['median_us'], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the detection hot path")
+    parser.add_argument('--regions', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regions.json'),
+                        help='regions.json to use (default: the shipped one)')
+    parser.add_argument('--mask', default=None, help='mask model name (default: first in file)')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--box-size', type=int, default=80)
+    parser.add_argument('--repeat', type=int, default=200, help='timed iterations per benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    parser.add_argument('--save-baseline', default=None, help='write results as the baseline file')
+    parser.add_argument('--baseline', default=None, help='compare medians against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"[Bench] Results saved: {path}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('resolution') != report['resolution']:
+            print(f"[Warning] Baseline resolution {baseline.get('resolution')} differs from {report['resolution']}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"[Bench] {len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}")
+            return 1
+        print("[Bench] No regressions")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,270 @@
+"""Camera mode probing: list modes, measure delivered FPS and latency, pick one
+
+    python camera_probe.py list                     # formats, sizes and rates the camera offers
+    python camera_probe.py probe                    # delivered FPS per mode
+    python camera_probe.py probe --latency --save   # also glass-to-app latency; store the best mode
+
+Modes come from `v4l2-ctl --list-formats-ext` when it is available (Linux,
+v4l-utils); otherwise common format/size/rate combinations are requested
+and the ones the driver actually accepts are kept.
+
+Each mode is opened with a one-frame driver buffer where the backend
+supports it, and frames are read for `--seconds` to measure the rate the
+camera really delivers. With `--latency`, point the camera at the screen:
+a window switches from black to white and the time until a captured frame
+brightens is measured, so the figure covers display, sensor, transport and
+decode (glass-to-app). It is best used to compare modes on the same setup.
+
+The best mode (lowest latency if measured, else highest delivered FPS, at
+least --min-width x --min-height) is saved as `camera_mode` in
+gui_config.json and applied by the capture code on the next start.
+"""
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+
+FOURCCS = ('MJPG', 'YUYV')
+SIZES = ((640, 480), (1280, 720), (1920, 1080))
+RATES = (30, 60)
+WINDOW = 'Camera latency probe'
+
+def _fourcc_str(code):
+    code = int(code)
+    s = ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+    return s if code and s.isprintable() else ''
+
+def _device_path(device):
+    return f'/dev/video{device}' if isinstance(device, int) else device
+
+def list_modes_v4l2(device):
+    """[(fourcc, width, height, fps)] from v4l2-ctl, or None when it is unavailable"""
+    if not sys.platform.startswith('linux') or not shutil.which('v4l2-ctl'):
+        return None
+    try:
+        out = subprocess.run(['v4l2-ctl', '-d', _device_path(device), '--list-formats-ext'],
+                             capture_output=True, text=True, timeout=10).stdout
+    except Exception as e:
+        print(f"[Warning] v4l2-ctl failed: {e}")
+        return None
+    modes, fourcc, size = [], None, None
+    for line in out.splitlines():
+        m = re.search(r"\[\d+\]: '(\w{4})'", line)
+        if m:
+            fourcc, size = m.group(1), None
+            continue
+        m = re.search(r'Size: Discrete (\d+)x(\d+)', line)
+        if m:
+            size = (int(m.group(1)), int(m.group(2)))
+            continue
+        m = re.search(r'\(([\d.]+) fps\)', line)
+        if m and fourcc and size:
+            modes.append((fourcc, size[0], size[1], float(m.group(1))))
+    return modes or None
+
+def _open(device, fourcc, width, height, fps, buffer_size=1):
+    cap = cv2.VideoCapture(device)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    # pixel format first: V4L2 picks the sizes/rates it offers from it
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    if buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+    return cap
+
+def _actual(cap, fourcc):
+    return (_fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)) or fourcc,
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            round(cap.get(cv2.CAP_PROP_FPS), 3))
+
+def list_modes_opencv(device):
+    """Request common modes and keep the distinct ones the driver settles on"""
+    modes = []
+    for fourcc in FOURCCS:
+        for width, height in SIZES:
+            for fps in RATES:
+                cap = _open(device, fourcc, width, height, fps, buffer_size=None)
+                if cap is None:
+                    return modes
+                mode = _actual(cap, fourcc)
+                cap.release()
+                if mode[1] and mode not in modes:
+                    modes.append(mode)
+    return modes
+
+def list_modes(device):
+    modes = list_modes_v4l2(device)
+    if modes is None:
+        print("[Probe] v4l2-ctl not available; probing common modes through OpenCV")
+        modes = list_modes_opencv(device)
+    return sorted(set(modes), key=lambda m: (m[0], m[1] * m[2], m[3]))
+
+def _brightness(frame):
+    # centre of a downscaled grey frame: the screen fills the middle of the view
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    return float(cv2.cvtColor(small[9:27, 16:48], cv2.COLOR_BGR2GRAY).mean())
+
+def _show(level, size=(640, 360)):
+    cv2.imshow(WINDOW, np.full((size[1], size[0], 3), level, dtype=np.uint8))
+    cv2.waitKey(1)
+
+def _settle(cap, seconds):
+    # drain queued frames and return the brightness of the last one
+    end = time.perf_counter() + seconds
+    value = None
+    while time.perf_counter() < end:
+        ret, frame = cap.read()
+        if ret:
+            value = _brightness(frame)
+    return value
+
+def measure_latency(cap, trials=5, timeout=1.0):
+    """Median ms from a black-to-white flash on screen to a brighter captured frame"""
+    cv2.namedWindow(WINDOW, cv2.WINDOW_NORMAL)
+    cv2.setWindowProperty(WINDOW, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    _show(0)
+    dark = _settle(cap, 1.0)
+    _show(255)
+    light = _settle(cap, 1.0)
+    if dark is None or light is None or light - dark < 20:
+        print("[Warning] Flash not visible to the camera (point it at the screen); latency skipped")
+        return None
+    threshold = (dark + light) / 2
+    samples = []
+    for _ in range(trials):
+        _show(0)
+        _settle(cap, 0.5)
+        _show(255)
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < timeout:
+            ret, frame = cap.read()
+            if ret and _brightness(frame) >= threshold:
+                samples.append((time.perf_counter() - t0) * 1000)
+                break
+    _show(0)
+    return float(np.median(samples)) if samples else None
+
+def measure_mode(device, mode, seconds=3.0, warmup=10, latency=False, trials=5):
+    fourcc, width, height, fps = mode
+    cap = _open(device, fourcc, width, height, fps)
+    if cap is None:
+        return None
+    try:
+        actual = _actual(cap, fourcc)
+        result = {'fourcc': fourcc, 'width': width, 'height': height, 'fps': fps,
+                  'actual': {'fourcc': actual[0], 'width': actual[1], 'height': actual[2], 'fps': actual[3]},
+                  'buffer_size': 1 if cap.get(cv2.CAP_PROP_BUFFERSIZE) == 1 else None}
+        for _ in range(warmup):
+            cap.read()
+        stamps = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            ret, _ = cap.read()
+            if ret:
+                stamps.append(time.perf_counter())
+        gaps = np.diff(stamps) * 1000 if len(stamps) > 1 else np.zeros(1)
+        result['delivered_fps'] = (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 else 0.0
+        result['frame_gap_p95_ms'] = float(np.percentile(gaps, 95))
+        result['latency_ms'] = measure_latency(cap, trials) if latency else None
+        return result
+    finally:
+        cap.release()
+
+def best_mode(results, min_width, min_height, target_fps, latency=False):
+    """Lowest latency (if measured), then highest delivered FPS, then the smaller frame
+
+    With `latency`, modes whose latency could not be measured are only
+    chosen when no mode was measured at all.
+    """
+    if latency:
+        results = [r for r in results if r['latency_ms'] is not None] or results
+    usable = [r for r in results if r['actual']['width'] >= min_width and r['actual']['height'] >= min_height] or results
+    fast = [r for r in usable if r['delivered_fps'] >= 0.9 * min(target_fps, r['fps'] or target_fps)] or usable
+    return min(fast, key=lambda r: (r['latency_ms'] if r['latency_ms'] is not None else float('inf'),
+                                    -round(r['delivered_fps']), r['actual']['width'] * r['actual']['height']))
+
+def _parse_device(value):
+    return int(value) if str(value).isdigit() else value
+
+def main(argv=None):
+    import yolo11n_arduino as detector
+    config = detector.config
+    default_device = config.video_source if str(config.video_source).isdigit() or \
+        str(config.video_source).startswith('/dev/') else 0
+    parser = argparse.ArgumentParser(description="List camera modes, measure delivered FPS and latency, pick the best")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('list', 'probe'):
+        p = sub.add_parser(name)
+        p.add_argument('--device', type=_parse_device, default=_parse_device(default_device),
+                       help='camera index or device path (default: video_source)')
+        if name == 'probe':
+            p.add_argument('--fourcc', default=None, help='only probe this pixel format, e.g. MJPG')
+            p.add_argument('--seconds', type=float, default=3.0, help='measurement time per mode')
+            p.add_argument('--latency', action='store_true', help='measure glass-to-app latency with a screen flash')
+            p.add_argument('--trials', type=int, default=5, help='flashes per mode')
+            p.add_argument('--min-width', type=int, default=config.capture_width)
+            p.add_argument('--min-height', type=int, default=config.capture_height)
+            p.add_argument('--json', default=None, help='write all results to this file')
+            p.add_argument('--save', action='store_true', help='store the best mode in gui_config.json')
+    args = parser.parse_args(argv)
+
+    modes = list_modes(args.device)
+    if not modes:
+        print(f"[Error] No modes found for camera {args.device}")
+        return 1
+    if args.command == 'list':
+        for fourcc, width, height, fps in modes:
+            print(f"[Probe] {fourcc} {width}x{height} @ {fps:g} FPS")
+        return 0
+
+    if args.fourcc:
+        modes = [m for m in modes if m[0] == args.fourcc]
+    results = []
+    try:
+        for mode in modes:
+            r = measure_mode(args.device, mode, args.seconds, latency=args.latency, trials=args.trials)
+            if r is None:
+                print(f"[Warning] Could not open camera {args.device} for {mode}")
+                continue
+            results.append(r)
+            a = r['actual']
+            lat = f", latency {r['latency_ms']:.0f} ms" if r['latency_ms'] is not None else ''
+            print(f"[Probe] {r['fourcc']} {r['width']}x{r['height']} @ {r['fps']:g} -> "
+                  f"{a['fourcc']} {a['width']}x{a['height']}: {r['delivered_fps']:.1f} FPS delivered, "
+                  f"gap p95 {r['frame_gap_p95_ms']:.1f} ms{lat}")
+    finally:
+        if args.latency:
+            cv2.destroyAllWindows()
+    if not results:
+        print("[Error] No mode could be measured")
+        return 1
+
+    best = best_mode(results, args.min_width, args.min_height, config.target_fps, args.latency)
+    a = best['actual']
+    print(f"[Probe] Best: {a['fourcc']} {a['width']}x{a['height']} @ {best['fps']:g} FPS "
+          f"({best['delivered_fps']:.1f} delivered)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'device': args.device, 'results': results, 'best': best}, f, indent=2)
+        print(f"[Probe] Report saved: {args.json}")
+    if args.save:
+        config.camera_mode = {'fourcc': a['fourcc'], 'width': a['width'], 'height': a['height'], 'fps': best['fps']}
+        if best['buffer_size']:
+            config.camera_mode['buffer_size'] = best['buffer_size']
+        config.capture_width, config.capture_height = a['width'], a['height']
+        config.save()
+        print(f"[Probe] Saved to {config.config_file}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
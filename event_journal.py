@@ -0,0 +1,306 @@
+"""Structured detection event journal
+
+EventJournal appends JSON lines (one event per line) from a background
+thread, flushing in batches bounded by count and time and rotating files by
+size, keeping at most `max_files` files. The command line tool streams
+the journal files line by line, so days of logs can be summarized without
+loading them into memory:
+
+    python event_journal.py summary journal/
+    python event_journal.py summary journal/ --since 2026-10-01 --false-stop-s 2 --json summary.json
+    python event_journal.py query journal/ --event stop --event resume --since 2026-10-17T06:00
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import datetime
+import threading
+
+JOURNAL_PREFIX = 'journal_'
+JOURNAL_SUFFIX = '.jsonl'
+
+def _journal_order(path):
+    # journal_<date>_<time>[_<n>].jsonl: start time, then the same-second counter
+    parts = os.path.basename(path)[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)].split('_')
+    n = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+    return (parts[0], parts[1] if len(parts) > 1 else '', n)
+
+class EventJournal:
+    """Append-only JSONL journal written by a background thread
+
+    `log()` never blocks the caller: events go on a bounded queue and are
+    dropped (and counted) if the writer falls behind. The writer flushes
+    when `flush_events` events are pending or `flush_interval` seconds have
+    passed, and starts a new file once the current one exceeds `max_bytes`,
+    deleting the oldest journal files beyond `max_files` (0 keeps them all).
+    """
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, flush_events=256, flush_interval=1.0, queue_size=10000,
+                 max_files=20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.path = None
+        self._file = None
+        self._size = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._thread = threading.Thread(target=self._run, name='event-journal', daemon=True)
+        self._thread.start()
+
+    def log(self, event, **fields):
+        """Queue an event; `t` (unix time) and `event` are added to `fields`"""
+        fields['t'] = round(time.time(), 4)
+        fields['event'] = event
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Flush pending events and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        if self.dropped:
+            print(f"[Journal] {self.dropped} events dropped (writer fell behind)")
+
+    def _open_new_file(self):
+        if self._file is not None:
+            self._file.close()
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{stamp}{JOURNAL_SUFFIX}")
+        # same-second files count up past the newest, even after pruning freed older names
+        same = [_journal_order(f)[2] for f in os.listdir(self.directory)
+                if f.startswith(f"{JOURNAL_PREFIX}{stamp}") and f.endswith(JOURNAL_SUFFIX)]
+        if same:
+            path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{stamp}_{max(same) + 1}{JOURNAL_SUFFIX}")
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = 0
+        if self.max_files:
+            self._prune()
+
+    def _prune(self):
+        files = sorted((f for f in os.listdir(self.directory)
+                        if f.startswith(JOURNAL_PREFIX) and f.endswith(JOURNAL_SUFFIX)), key=_journal_order)
+        for name in files[:max(0, len(files) - self.max_files)]:
+            path = os.path.join(self.directory, name)
+            if path == self.path:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[Warning] Failed to remove old journal {path}: {e}")
+
+    def _write(self, batch):
+        if self._file is None or self._size >= self.max_bytes:
+            self._open_new_file()
+        data = ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in batch)
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if item:
+                batch.append(item)
+            if len(batch) >= self.flush_events or time.monotonic() >= deadline:
+                if batch:
+                    try:
+                        self._write(batch)
+                    except Exception as e:
+                        print(f"[Warning] Failed to write event journal: {e}")
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+        try:
+            if batch:
+                self._write(batch)
+        except Exception as e:
+            print(f"[Warning] Failed to write event journal: {e}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def iter_events(paths, since=None, until=None, events=None):
+    """Yield events from journal files/directories in time order, one line at a time"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, f) for f in os.listdir(path)
+                         if f.startswith(JOURNAL_PREFIX) and f.endswith(JOURNAL_SUFFIX))
+        else:
+            files.append(path)
+    # file names carry the start timestamp, so name order is time order
+    for path in sorted(files, key=_journal_order):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash
+                t = e.get('t', 0)
+                if since is not None and t < since:
+                    continue
+                if until is not None and t >= until:
+                    continue
+                if events and e.get('event') not in events:
+                    continue
+                yield e
+
+class _Dwell:
+    # running count/sum/min/max without keeping the samples
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, v):
+        self.count += 1
+        self.total += v
+        self.min = v if self.min is None else min(self.min, v)
+        self.max = v if self.max is None else max(self.max, v)
+
+    def as_dict(self):
+        return {'count': self.count, 'total_s': round(self.total, 3),
+                'mean_s': round(self.total / self.count, 3) if self.count else None,
+                'min_s': self.min, 'max_s': self.max}
+
+def summarize(events, false_stop_s=2.0, max_candidates=200):
+    """Stop counts, dwell times and false-stop candidates from an event stream
+
+    A stop is a false-stop candidate when the line resumed within
+    `false_stop_s` seconds, or when the detection that caused it lasted less
+    than that.
+    """
+    stops = {'detection': 0, 'manual': 0}
+    per_day = {}
+    dwell = _Dwell()
+    detection_dwell = _Dwell()
+    candidates = []
+    pending_stop = None        # (t, reason) of the last stop without a resume
+    detection_since = None
+    last_detection_stop = None  # stop event waiting for its detection to end
+    acks = 0
+    frames = 0
+    first_t = last_t = None
+
+    def flag(stop_t, why, **detail):
+        # one candidate per stop, listing every reason it was flagged
+        for c in candidates[-2:]:
+            if c['t'] == stop_t:
+                c['why'].append(why)
+                c.update(detail)
+                return
+        if len(candidates) < max_candidates:
+            candidates.append(dict(t=stop_t, why=[why], **detail))
+
+    for e in events:
+        t = e.get('t', 0.0)
+        first_t = t if first_t is None else first_t
+        last_t = t
+        kind = e.get('event')
+        if kind == 'frame':
+            frames += 1
+        elif kind == 'serial_ack':
+            acks += 1
+        elif kind == 'detection_start':
+            detection_since = t
+        elif kind == 'detection_end':
+            if detection_since is not None:
+                detection_dwell.add(t - detection_since)
+                if last_detection_stop is not None and t - detection_since < false_stop_s:
+                    flag(last_detection_stop, 'short_detection', detection_s=round(t - detection_since, 3))
+            detection_since = None
+            last_detection_stop = None
+        elif kind == 'stop':
+            reason = e.get('reason', 'manual')
+            stops[reason] = stops.get(reason, 0) + 1
+            day = datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d')
+            per_day[day] = per_day.get(day, 0) + (1 if reason == 'detection' else 0)
+            pending_stop = (t, reason)
+            if reason == 'detection':
+                last_detection_stop = t
+        elif kind == 'resume' and pending_stop is not None:
+            stop_t, reason = pending_stop
+            if reason == 'detection':
+                dwell.add(t - stop_t)
+                if t - stop_t < false_stop_s:
+                    flag(stop_t, 'quick_resume', dwell_s=round(t - stop_t, 3))
+            pending_stop = None
+    for c in candidates:
+        c['time'] = datetime.datetime.fromtimestamp(c['t']).isoformat(timespec='milliseconds')
+    return {
+        'from': datetime.datetime.fromtimestamp(first_t).isoformat(timespec='seconds') if first_t else None,
+        'to': datetime.datetime.fromtimestamp(last_t).isoformat(timespec='seconds') if last_t else None,
+        'frames': frames,
+        'serial_acks': acks,
+        'stops': stops,
+        'detection_stops_per_day': per_day,
+        'stop_dwell': dwell.as_dict(),
+        'detection_duration': detection_dwell.as_dict(),
+        'false_stop_candidates': candidates,
+    }
+
+def _parse_time(value):
+    if value is None:
+        return None
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize or query the detection event journal")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('summary', 'query'):
+        p = sub.add_parser(name)
+        p.add_argument('paths', nargs='+', help='journal directory or .jsonl files')
+        p.add_argument('--since', help='ISO date/time, e.g. 2026-10-01 or 2026-10-01T06:00')
+        p.add_argument('--until', help='ISO date/time (exclusive)')
+    summary = sub.choices['summary']
+    summary.add_argument('--false-stop-s', type=float, default=2.0,
+                         help='stops resumed, or detections ended, within this many seconds are flagged')
+    summary.add_argument('--json', help='also write the summary to this file')
+    query = sub.choices['query']
+    query.add_argument('--event', action='append', help='event type to print (repeatable)')
+    args = parser.parse_args(argv)
+
+    since, until = _parse_time(args.since), _parse_time(args.until)
+    if args.command == 'query':
+        for e in iter_events(args.paths, since, until, set(args.event) if args.event else None):
+            sys.stdout.write(json.dumps(e, separators=(',', ':')) + '\n')
+        return 0
+
+    # frame summaries are the bulk of the journal and only counted here
+    result = summarize(iter_events(args.paths, since, until), false_stop_s=args.false_stop_s)
+    print(f"[Journal] {result['from']} .. {result['to']}: {result['frames']} frames")
+    print(f"[Journal] Stops: {result['stops']}")
+    for day, n in sorted(result['detection_stops_per_day'].items()):
+        print(f"[Journal]   {day}: {n} detection stops")
+    d = result['stop_dwell']
+    if d['count']:
+        print(f"[Journal] Stop dwell: mean {d['mean_s']:.2f}s, min {d['min_s']:.2f}s, max {d['max_s']:.2f}s")
+    print(f"[Journal] False-stop candidates: {len(result['false_stop_candidates'])}")
+    for c in result['false_stop_candidates'][:20]:
+        detail = ', '.join(f"{k[:-2]} {c[k]}s" for k in ('dwell_s', 'detection_s') if k in c)
+        print(f"[Journal]   {c['time']} {'+'.join(c['why'])} ({detail})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+import time
+
+class FrameScheduler:
+    """Deadline-based pacing for a Tk `after()` frame loop
+
+    Frame k is due at t0 + k / target_fps on the monotonic clock, so the
+    period no longer stretches by the processing time. Painting runs on its
+    own, slower deadline (display_fps) and is skipped for frames that run
+    behind schedule; detection is never skipped. When the loop misses a
+    deadline, deadlines are re-anchored instead of bursting to catch up, and
+    the missed deadlines are counted. Under sustained overload a paint is still
+    forced every `max_paint_gap` display periods so the preview never freezes.
+    """
+    def __init__(self, target_fps=30.0, display_fps=None, metrics=None, report_interval=10.0, max_paint_gap=4):
+        self.period = 1.0 / target_fps
+        display_fps = min(display_fps or target_fps, target_fps)
+        self.display_period = 1.0 / display_fps
+        self.metrics = metrics
+        self.report_interval = report_interval
+        self.deadline = None
+        self.next_paint = 0.0
+        self.last_paint = 0.0
+        self.max_paint_gap = max_paint_gap
+        self.late = 0.0
+        self.behind = False  # previous frame overran its deadline
+        self.missed = 0
+        self.renders_skipped = 0
+        self._reported_missed = 0
+        self._last_report = time.monotonic()
+
+    def begin_frame(self):
+        """Call at the top of each frame; returns how late (s) the frame started"""
+        now = time.monotonic()
+        if self.deadline is None:
+            self.deadline = now
+            self.next_paint = now
+        self.late = max(0.0, now - self.deadline)
+        return self.late
+
+    def should_render(self):
+        """True if this frame should be painted (on time and a paint is due)"""
+        now = time.monotonic()
+        if now + 0.5 * self.period < self.next_paint:
+            return False
+        stalled = now - self.last_paint >= self.max_paint_gap * self.display_period
+        if (self.behind or self.late > self.period) and not stalled:
+            self.renders_skipped += 1
+            if self.metrics is not None:
+                self.metrics.incr('renders_skipped')
+            return False
+        self.next_paint = max(self.next_paint + self.display_period, now)
+        self.last_paint = now
+        return True
+
+    def next_delay_ms(self):
+        """Advance to the next deadline and return the delay for root.after()"""
+        now = time.monotonic()
+        self.deadline += self.period
+        self.behind = now > self.deadline
+        if self.behind:
+            missed = int((now - self.deadline) / self.period) + 1
+            self.missed += missed
+            if self.metrics is not None:
+                self.metrics.incr('deadlines_missed', missed)
+            self.deadline = now  # re-anchor: no burst of back-to-back frames
+        self._report(now)
+        # at least 1 ms so Tk gets to process input events between frames
+        return max(1, int(round((self.deadline - now) * 1000)))
+
+    def _report(self, now):
+        if now - self._last_report < self.report_interval:
+            return
+        missed = self.missed - self._reported_missed
+        if missed:
+            print(f"[Scheduler] {missed} missed frame deadlines in the last {now - self._last_report:.0f}s "
+                  f"(target {1.0 / self.period:.0f} FPS)")
+        self._reported_missed = self.missed
+        self._last_report = now
@@ -0,0 +1,293 @@
+"""Frame sources for the detector and Region Creator
+
+`open_source(spec)` picks the source from the spec:
+
+    0, "1"                       camera index
+    "/dev/video2"                camera device path
+    "rtsp://...", "http://..."   network stream (RTSP/HTTP/UDP/TCP)
+    "clip.mp4"                   video file
+    "frames/"                    directory of images, in name order
+
+Every source has `read(buf=None) -> (ok, frame)`, `release()`, and reports
+its native `width`, `height` and `fps` so callers can size the pipeline to
+it. Live sources (cameras, streams) reconnect on their own with backoff
+when reads fail; `read()` returns (False, None) until they are back. Files
+and image directories are decoded ahead on a thread into a bounded pool of
+buffers.
+"""
+import os
+import time
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from resource_governor import pin_thread
+
+STREAM_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+class LiveSource:
+    """Camera or network stream read on the caller's thread, reconnecting with backoff
+
+    Reads stay synchronous so the caller always gets the newest frame. After
+    `max_failures` consecutive failed reads the capture is released and
+    reopened on a background thread, waiting `backoff` seconds between
+    attempts, doubled up to `max_backoff`.
+    """
+    live = True
+
+    def __init__(self, target, width=None, height=None, fps=None, props=None, fourcc=None, buffer_size=None,
+                 backoff=0.5, max_backoff=10.0, max_failures=5):
+        self.target = target
+        self.requested = (width, height, fps)
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.props = props or {}
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.reconnects = 0
+        self.width = self.height = 0
+        self.fps = 0.0
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._reconnecting = None
+        self._released = False
+        self._cap = self._open()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.target)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        width, height, fps = self.requested
+        # pixel format first: V4L2 picks the sizes/rates it offers from it
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        if self.buffer_size:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        for prop, value in self.props.items():
+            cap.set(prop, value)
+        # the mode the device actually delivers, not the one requested
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or self.width or (width or 0)
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or self.height or (height or 0)
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps or (fps or 0.0)
+        return cap
+
+    def isOpened(self):
+        return self._cap is not None
+
+    def read(self, buf=None):
+        cap = self._cap
+        if cap is None:
+            return False, None
+        ret, frame = cap.read(buf)
+        if ret:
+            self._failures = 0
+            return True, frame
+        self._failures += 1
+        if self._failures >= self.max_failures:
+            self._start_reconnect()
+        return False, None
+
+    def _start_reconnect(self):
+        with self._lock:
+            if self._reconnecting is not None or self._released:
+                return
+            cap, self._cap = self._cap, None
+            self._reconnecting = threading.Thread(target=self._reconnect, args=(cap,),
+                                                  name='source-reconnect', daemon=True)
+            self._reconnecting.start()
+
+    def _reconnect(self, old):
+        if old is not None:
+            old.release()
+        delay = self.backoff
+        print(f"[Source] Lost {self.target}; reconnecting")
+        while not self._released:
+            time.sleep(delay)
+            cap = self._open()
+            if cap is not None:
+                with self._lock:
+                    if self._released:
+                        cap.release()
+                        return
+                    self._cap = cap
+                    self._failures = 0
+                    self.reconnects += 1
+                    self._reconnecting = None
+                print(f"[Source] Reconnected to {self.target} ({self.width}x{self.height} @ {self.fps:.0f} FPS)")
+                return
+            delay = min(delay * 2, self.max_backoff)
+
+    def release(self):
+        with self._lock:
+            self._released = True
+            cap, self._cap = self._cap, None
+        if cap is not None:
+            cap.release()
+
+    def describe(self):
+        fmt = f"{self.fourcc} " if self.fourcc else ''
+        return f"{self.target} ({fmt}{self.width}x{self.height} @ {self.fps:.0f} FPS, live)"
+
+class _DecodeAheadSource:
+    """Decodes frames on a thread into a bounded pool of buffers
+
+    The frame returned by `read()` stays valid until the next `read()`,
+    when its buffer goes back to the decoder.
+    """
+    live = False
+
+    def __init__(self, loop=False, queue_size=8, resources=None):
+        self.loop = loop
+        self.eof = False
+        self._resources = resources
+        self._ready = queue.Queue(maxsize=queue_size)
+        self._free = queue.Queue()
+        self._held = None
+        self._stop = threading.Event()
+        for _ in range(queue_size + 1):
+            self._free.put(np.empty((self.height, self.width, 3), dtype=np.uint8))
+        self._thread = threading.Thread(target=self._run, name='source-decode', daemon=True)
+        self._thread.start()
+
+    def isOpened(self):
+        return True
+
+    def _run(self):
+        if self._resources:
+            pin_thread(self._resources, 'capture')
+        while not self._stop.is_set():
+            try:
+                buf = self._free.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            frame = self._decode(buf)
+            if frame is None and self.loop and self._rewind():
+                frame = self._decode(buf)
+            if frame is None:
+                self._ready.put(None)
+                return
+            self._ready.put(frame)
+
+    def read(self, buf=None):
+        """Next decoded frame; `buf` is ignored (the pool's buffers are reused)"""
+        if self._held is not None:
+            self._free.put(self._held)
+            self._held = None
+        if self.eof:
+            return False, None
+        try:
+            frame = self._ready.get(timeout=0.1)
+        except queue.Empty:
+            return False, None  # decoder behind; try again next frame
+        if frame is None:
+            self.eof = True
+            print(f"[Source] End of {self.path}")
+            return False, None
+        self._held = frame
+        return True, frame
+
+    def release(self):
+        self._stop.set()
+        try:
+            while True:
+                self._ready.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join(timeout=2)
+        self._close()
+
+class VideoFileSource(_DecodeAheadSource):
+    def __init__(self, path, loop=False, queue_size=8, resources=None):
+        self.path = path
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Cannot open video file: {path}")
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(loop, queue_size, resources)
+
+    def _decode(self, buf):
+        ret, frame = self._cap.read(buf)
+        if not ret:
+            return None
+        if frame.shape != buf.shape:  # odd files: keep the advertised size
+            return cv2.resize(frame, (self.width, self.height), dst=buf)
+        return frame
+
+    def _rewind(self):
+        return self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _close(self):
+        self._cap.release()
+
+    def describe(self):
+        return f"{self.path} ({self.width}x{self.height} @ {self.fps:.0f} FPS, file)"
+
+class ImageDirSource(_DecodeAheadSource):
+    def __init__(self, path, fps=30.0, loop=False, queue_size=8, resources=None):
+        self.path = path
+        self.files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise RuntimeError(f"No images in {path}")
+        first = cv2.imread(self.files[0])
+        if first is None:
+            raise RuntimeError(f"Cannot read image: {self.files[0]}")
+        self.height, self.width = first.shape[:2]
+        self.fps = fps
+        self._index = 0
+        super().__init__(loop, queue_size, resources)
+
+    def _decode(self, buf):
+        while self._index < len(self.files):
+            img = cv2.imread(self.files[self._index])
+            self._index += 1
+            if img is None:
+                continue
+            if img.shape != buf.shape:
+                return cv2.resize(img, (self.width, self.height), dst=buf)
+            np.copyto(buf, img)
+            return buf
+        return None
+
+    def _rewind(self):
+        self._index = 0
+        return True
+
+    def _close(self):
+        pass
+
+    def describe(self):
+        return f"{self.path} ({len(self.files)} images, {self.width}x{self.height} @ {self.fps:.0f} FPS)"
+
+def open_source(spec, width=None, height=None, fps=None, loop=False, props=None, resources=None, mode=None):
+    """Open a camera, stream, video file or image directory from a config value
+
+    `mode` is a camera_mode dict (fourcc, width, height, fps, buffer_size)
+    as saved by camera_probe.py; it applies to cameras only.
+    """
+    mode = mode or {}
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()) or str(spec).startswith('/dev/'):
+        return LiveSource(int(spec) if str(spec).isdigit() else spec,
+                          mode.get('width', width), mode.get('height', height), mode.get('fps', fps), props,
+                          fourcc=mode.get('fourcc'), buffer_size=mode.get('buffer_size'))
+    spec = str(spec)
+    if spec.lower().startswith(STREAM_SCHEMES):
+        return LiveSource(spec, width, height, fps, props)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps=fps or 30.0, loop=loop, resources=resources)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, loop=loop, resources=resources)
+    raise RuntimeError(f"Unknown video source: {spec}")
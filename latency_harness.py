@@ -0,0 +1,361 @@
+"""Detection-to-stop latency harness
+
+Drives the real detection path (process_frame + ROI mask + send_command)
+with a synthetic camera and a pty-backed fake Arduino that speaks the same
+`sig:speed` protocol as arduino_speed_control.ino. Each trial injects an
+object into the ROI at a known capture timestamp and measures how long it
+takes for the stop command to arrive at the fake Arduino.
+
+POSIX only (uses pty). No camera, Arduino or YOLO weights required.
+
+    python latency_harness.py --trials 50
+    python latency_harness.py --trials 50 --infer-ms 25 --json latency.json
+    python latency_harness.py --model weights/YOLO11n.pt --background recordings/recording_x.mp4
+"""
+import os
+import pty
+import tty
+import time
+import json
+import select
+import argparse
+import threading
+
+import cv2
+import numpy as np
+import serial
+
+import yolo11n_arduino as detector
+
+# BGR colour of injected objects; the stub model detects exactly this colour
+OBJECT_COLOR = (255, 0, 255)
+
+class FakeArduino:
+    """Serial peer on a pseudo-terminal that parses and echoes like arduino_speed_control.ino"""
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # no line discipline: bytes arrive exactly as written
+        self.port_name = os.ttyname(self.slave)
+        self.commands = []  # (t_first_byte, t_newline, sig, speed)
+        self.command = '0'
+        self.motor_speed = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-arduino', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._println("Arduino ready!")
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _println(self, text):
+        os.write(self.master, (text + "\r\n").encode())
+
+    def _run(self):
+        buf = b''
+        t_first = None
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            chunk = os.read(self.master, 256)
+            now = time.perf_counter()
+            if t_first is None:
+                t_first = now
+            buf += chunk
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                self._handle(line.decode(errors='replace').strip(), t_first, now)
+                t_first = now if buf else None
+
+    def _handle(self, data, t_first, t_line):
+        # Mirrors loop() in arduino_speed_control.ino
+        if ':' in data:
+            cmd_str, speed_str = data.split(':', 1)
+            self.command = cmd_str[:1]
+            try:
+                self.motor_speed = int(speed_str)
+            except ValueError:
+                self.motor_speed = 0  # String.toInt() returns 0 on garbage
+            self._println(f"Received command: {self.command}, speed: {self.motor_speed}")
+        else:
+            self.command = data[:1]
+            self._println(f"Received legacy command: {self.command}")
+            if self.command == '1':
+                self.motor_speed = 255
+            elif self.command == '0':
+                self.motor_speed = 0
+        with self._cond:
+            self.commands.append((t_first, t_line, self.command, self.motor_speed))
+            self._cond.notify_all()
+
+    def wait_for_command(self, sig, since, timeout=2.0):
+        """Return the first command `sig` whose first byte arrived after `since`, or None"""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while True:
+                for cmd in self.commands:
+                    if cmd[2] == sig and cmd[0] >= since:
+                        return cmd
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+class SyntheticFrameSource:
+    """Paced frame source that draws objects into the frame at known timestamps
+
+    The background is fixed noise, or frames looped from a recorded video.
+    `read()` returns (frame, capture_timestamp) with the timestamp taken
+    when the frame is released, like a camera delivering at `fps`.
+    """
+    def __init__(self, width, height, fps=30.0, background=None, seed=0):
+        self.width, self.height = width, height
+        self.period = 1.0 / fps if fps else 0.0
+        self._next = time.perf_counter()
+        self._frame = np.empty((height, width, 3), dtype=np.uint8)
+        self.objects = []  # [(x1, y1, x2, y2)] drawn into the next frames
+        self._video = None
+        if background:
+            self._video = cv2.VideoCapture(background)
+            if not self._video.isOpened():
+                raise RuntimeError(f"Cannot open background video: {background}")
+        rng = np.random.default_rng(seed)
+        self._background = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+
+    def _next_background(self):
+        if self._video is None:
+            return self._background
+        ret, frame = self._video.read()
+        if not ret:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._video.read()
+            if not ret:
+                return self._background
+        return cv2.resize(frame, (self.width, self.height), dst=self._background)
+
+    def read(self):
+        if self.period:
+            delay = self._next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self.period, time.perf_counter())
+        np.copyto(self._frame, self._next_background())
+        for x1, y1, x2, y2 in self.objects:
+            cv2.rectangle(self._frame, (x1, y1), (x2, y2), OBJECT_COLOR, -1)
+        return self._frame, time.perf_counter()
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+
+class _Array:
+    # stands in for a torch tensor: .cpu().numpy()
+    def __init__(self, a):
+        self.a = a
+    def cpu(self):
+        return self
+    def numpy(self):
+        return self.a
+
+class StubBox:
+    def __init__(self, xyxy, conf):
+        self.xyxy = [_Array(np.asarray(xyxy, dtype=np.float32))]
+        self.conf = [conf]
+
+class StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class StubModel:
+    """Stand-in for ultralytics.YOLO with the same call and result shape
+
+    Detects OBJECT_COLOR blobs by colour threshold, or returns `fixed_boxes`
+    (in inference-frame coordinates) on every call when given. `latency`
+    seconds are slept per call to emulate inference time.
+    """
+    def __init__(self, fixed_boxes=None, conf=0.9, latency=0.0, min_area=16):
+        self.fixed_boxes = fixed_boxes
+        self.conf = conf
+        self.latency = latency
+        self.min_area = min_area
+
+    def __call__(self, img, conf=0.25, verbose=False):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.conf < conf:
+            return [StubResult([])]
+        if self.fixed_boxes is not None:
+            return [StubResult([StubBox(b, self.conf) for b in self.fixed_boxes])]
+        hit = cv2.inRange(img, OBJECT_COLOR, OBJECT_COLOR)
+        contours, _ = cv2.findContours(hit, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for c in contours:
+            x, y, w, h = cv2.boundingRect(c)
+            if w * h >= self.min_area:
+                boxes.append(StubBox((x, y, x + w, y + h), self.conf))
+        return [StubResult(boxes)]
+
+def pick_roi_boxes(mask, size, count, seed=0):
+    """Choose `count` boxes of `size` px that check_box_in_roi accepts on `mask`"""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        raise RuntimeError("Selected mask is empty")
+    h, w = mask.shape
+    half = size // 2
+    boxes = []
+    for _ in range(count * 50):
+        i = rng.integers(len(xs))
+        x1 = int(min(max(xs[i] - half, 0), w - size))
+        y1 = int(min(max(ys[i] - half, 0), h - size))
+        box = (x1, y1, x1 + size, y1 + size)
+        if detector.check_box_in_roi(box, mask):
+            boxes.append(box)
+            if len(boxes) == count:
+                return boxes
+    raise RuntimeError("Could not place objects inside the ROI; try a smaller --object-size")
+
+def summarize(values):
+    """p50/p95/p99/mean/max (ms) of a list of seconds"""
+    if not values:
+        return {}
+    a = np.asarray(values) * 1e3
+    return {
+        'count': int(a.size),
+        'p50_ms': float(np.percentile(a, 50)),
+        'p95_ms': float(np.percentile(a, 95)),
+        'p99_ms': float(np.percentile(a, 99)),
+        'mean_ms': float(a.mean()),
+        'max_ms': float(a.max()),
+    }
+
+def run(args):
+    with open(args.regions, 'r') as f:
+        data = json.load(f)
+    mask_name = args.mask or next(iter(data))
+    width, height = args.width, args.height
+    mask = detector.build_mask(data[mask_name], width, height)
+    index = detector.region_index(data[mask_name], width, height)
+
+    if args.model:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+    else:
+        model = StubModel(latency=args.infer_ms / 1000.0)
+
+    source = SyntheticFrameSource(width, height, fps=args.fps, background=args.background, seed=args.seed)
+    fake = FakeArduino().start()
+    port = serial.Serial(port=fake.port_name, baudrate=args.baud_rate, timeout=1)
+    annotated = np.empty((height, width, 3), dtype=np.uint8)
+    infer_w, infer_h = detector.infer_size(width, height)
+    small = np.empty((infer_h, infer_w, 3), dtype=np.uint8)
+    boxes = pick_roi_boxes(mask, args.object_size, args.trials, seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    end_to_end, detect_delay, serial_transit, frames_to_detect = [], [], [], []
+    misses = 0
+    try:
+        detector.send_command(port, '1', args.speed)
+        last_signal = '1'
+        for trial, box in enumerate(boxes):
+            # clear scene for a few frames so the trial starts from a running motor
+            source.objects = []
+            for _ in range(int(rng.integers(3, 10))):
+                frame, _ = source.read()
+                detector.process_frame(frame, mask, model, out=annotated, small=small, index=index)
+            source.objects = [box]
+            t_inject = None
+            t_detect = None
+            for n in range(args.max_frames):
+                frame, t_cap = source.read()
+                if t_inject is None:
+                    t_inject = t_cap
+                _, detected = detector.process_frame(frame, mask, model, out=annotated, small=small, index=index)
+                if detected and last_signal != '0':
+                    t_detect = time.perf_counter()
+                    detector.send_command(port, '0', 0)
+                    last_signal = '0'
+                    frames_to_detect.append(n + 1)
+                    break
+            if t_detect is None:
+                misses += 1
+                print(f"[Harness] Trial {trial}: no detection within {args.max_frames} frames")
+                continue
+            received = fake.wait_for_command('0', since=t_detect)
+            if received is None:
+                misses += 1
+                print(f"[Harness] Trial {trial}: stop command never reached the fake Arduino")
+            else:
+                end_to_end.append(received[0] - t_inject)
+                detect_delay.append(t_detect - t_inject)
+                serial_transit.append(received[0] - t_detect)
+            # resume like auto-resume once the object is gone
+            source.objects = []
+            t_resume = time.perf_counter()
+            detector.send_command(port, '1', args.speed)
+            last_signal = '1'
+            fake.wait_for_command('1', since=t_resume)
+            port.reset_input_buffer()  # drop the echoes so the pty buffer never fills
+    finally:
+        port.close()
+        fake.close()
+        source.release()
+
+    wire_ms = 4 * 10 / args.baud_rate * 1e3  # "0:0\n" at 10 bits per byte; a pty has no baud rate
+    report = {
+        'trials': len(boxes),
+        'misses': misses,
+        'mask': mask_name,
+        'resolution': [width, height],
+        'fps': args.fps,
+        'model': args.model or f'stub ({args.infer_ms} ms)',
+        'capture_to_serial_rx': summarize(end_to_end),
+        'capture_to_command': summarize(detect_delay),
+        'serial_transit': summarize(serial_transit),
+        'frames_to_detect': {'mean': float(np.mean(frames_to_detect)) if frames_to_detect else None,
+                             'max': int(max(frames_to_detect)) if frames_to_detect else None},
+        'estimated_wire_ms': wire_ms,
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure detection-to-stop latency against a simulated Arduino")
+    parser.add_argument('--regions', default=detector.config.region_json_path, help='regions.json to use')
+    parser.add_argument('--mask', default=None, help='mask model name (default: first in file)')
+    parser.add_argument('--model', default=None, help='YOLO weights; default is a colour-threshold stub model')
+    parser.add_argument('--background', default=None, help='recorded video to use as background frames')
+    parser.add_argument('--trials', type=int, default=30)
+    parser.add_argument('--fps', type=float, default=30.0, help='synthetic camera rate (0 = unpaced)')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--object-size', type=int, default=120)
+    parser.add_argument('--infer-ms', type=float, default=0.0, help='stub model inference delay')
+    parser.add_argument('--max-frames', type=int, default=30, help='frames to wait for a detection per trial')
+    parser.add_argument('--speed', type=int, default=detector.config.motor_speed)
+    parser.add_argument('--baud-rate', type=int, default=detector.config.baud_rate)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='write the report to this file')
+    args = parser.parse_args()
+
+    report = run(args)
+    e2e = report['capture_to_serial_rx']
+    print(f"[Harness] {report['trials'] - report['misses']}/{report['trials']} stops measured ({report['model']})")
+    if e2e:
+        print(f"[Harness] capture -> Arduino rx: p50 {e2e['p50_ms']:.1f} ms, p95 {e2e['p95_ms']:.1f} ms, "
+              f"p99 {e2e['p99_ms']:.1f} ms, max {e2e['max_ms']:.1f} ms "
+              f"(+~{report['estimated_wire_ms']:.1f} ms wire time at {args.baud_rate} baud)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[Harness] Report saved: {args.json}")
+    return 1 if report['misses'] else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
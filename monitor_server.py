@@ -0,0 +1,215 @@
+"""Local HTTP monitoring: MJPEG preview stream and JSON status
+
+    GET /          minimal page showing the stream and status
+    GET /stream    multipart/x-mixed-replace MJPEG stream
+    GET /snapshot  latest JPEG frame
+    GET /status    JSON status (run state, motor, detection, stage timings, counters)
+
+Frames are downscaled on the detection loop and JPEG-encoded once on the
+encoder thread at `fps`, then the same bytes are sent to every client.
+Each client has its own thread that always sends the newest frame, so a
+slow client skips frames, and one that cannot take a frame within
+`send_timeout` seconds is disconnected; the detection loop never waits.
+"""
+import json
+import time
+import socket
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BOUNDARY = 'guidewayframe'
+INDEX_HTML = b"""<!doctype html><html><head><title>Guideway</title></head>
+<body style="background:#222;color:#ddd;font-family:monospace">
+<img src="/stream" style="max-width:100%"><pre id="s"></pre>
+<script>setInterval(()=>fetch('/status').then(r=>r.json()).then(j=>{
+document.getElementById('s').textContent=JSON.stringify(j,null,2)}),1000)</script>
+</body></html>"""
+
+class MonitorServer:
+    """Optional HTTP server thread sharing one encoded frame with all clients"""
+    def __init__(self, host='0.0.0.0', port=8080, fps=5.0, width=640, quality=70,
+                 max_clients=8, send_timeout=2.0, status_interval=1.0):
+        self.period = 1.0 / fps if fps else 0.0
+        self.width = width
+        self.quality = quality
+        self.max_clients = max_clients
+        self.send_timeout = send_timeout
+        self.status_interval = status_interval
+        self.clients = 0
+        self.dropped_clients = 0
+        self.routes = {}  # extra GET handlers: path -> fn(query) -> (content type, bytes)
+        self._next_frame = 0.0
+        self._wanted_until = 0.0  # /snapshot keeps frames coming for a while without stream clients
+        self._next_status = 0.0
+        self._buf = None
+        self._pending = False
+        self._jpeg = None
+        self._seq = 0
+        self._status = b'{}'
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._encode_event = threading.Event()
+        self._stop = threading.Event()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._encoder = threading.Thread(target=self._encode_loop, name='monitor-encoder', daemon=True)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='monitor-http', daemon=True)
+
+    def start(self):
+        self._encoder.start()
+        self._thread.start()
+        host, port = self._httpd.server_address[:2]
+        print(f"[Monitor] Serving on http://{host}:{port}/ (stream /stream, status /status)")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._encode_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def frame_due(self):
+        """True when someone is watching and the next stream frame is due"""
+        now = time.monotonic()
+        return (self.clients > 0 or now < self._wanted_until) and now >= self._next_frame
+
+    def offer(self, frame):
+        """Hand a BGR frame to the encoder if one is due; cheap no-op otherwise"""
+        if not self.frame_due() or self._pending:
+            return False
+        self._next_frame = time.monotonic() + self.period
+        h, w = frame.shape[:2]
+        size = (self.width, max(2, int(round(h * self.width / w)))) if w > self.width else (w, h)
+        if self._buf is None or self._buf.shape[1::-1] != size:
+            self._buf = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        if size == (w, h):
+            np.copyto(self._buf, frame)
+        else:
+            cv2.resize(frame, size, dst=self._buf, interpolation=cv2.INTER_AREA)
+        self._pending = True
+        self._encode_event.set()
+        return True
+
+    def status_due(self):
+        return time.monotonic() >= self._next_status
+
+    def set_status(self, status):
+        """Publish the JSON status (serialized here, once, for all readers)"""
+        self._next_status = time.monotonic() + self.status_interval
+        status['monitor'] = {'clients': self.clients, 'dropped_clients': self.dropped_clients}
+        data = json.dumps(status).encode()
+        with self._lock:
+            self._status = data
+
+    def _encode_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+        while not self._stop.is_set():
+            self._encode_event.wait()
+            self._encode_event.clear()
+            if self._stop.is_set():
+                break
+            if not self._pending:
+                continue
+            ok, jpeg = cv2.imencode('.jpg', self._buf, params)
+            self._pending = False
+            if ok:
+                with self._cond:
+                    self._jpeg = jpeg.tobytes()
+                    self._seq += 1
+                    self._cond.notify_all()
+
+    def _next_jpeg(self, seq, timeout):
+        # newest frame after `seq`, skipping any this client missed
+        with self._cond:
+            if self._seq == seq and not self._stop.is_set():
+                self._cond.wait(timeout)
+            return self._seq, self._jpeg
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass  # keep the console for the detector's own logs
+
+            def _send(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                if url.path == '/':
+                    self._send(200, 'text/html', INDEX_HTML)
+                elif url.path == '/status':
+                    with server._lock:
+                        body = server._status
+                    self._send(200, 'application/json', body)
+                elif url.path == '/snapshot':
+                    # the last frame is stale if nobody was watching: wait for a fresh one
+                    idle = server.clients == 0 and time.monotonic() >= server._wanted_until
+                    server._wanted_until = time.monotonic() + 10.0
+                    with server._cond:
+                        if server._jpeg is None or idle:
+                            server._cond.wait(2.0)
+                        jpeg = server._jpeg
+                    if jpeg is None:
+                        self._send(503, 'text/plain', b'no frame yet\n')
+                    else:
+                        self._send(200, 'image/jpeg', jpeg)
+                elif url.path == '/stream':
+                    self._stream()
+                elif url.path in server.routes:
+                    try:
+                        content_type, body = server.routes[url.path](urllib.parse.parse_qs(url.query))
+                        self._send(200, content_type, body)
+                    except Exception as e:
+                        self._send(500, 'text/plain', f'{e}\n'.encode())
+                else:
+                    self._send(404, 'text/plain', b'not found\n')
+
+            def _stream(self):
+                with server._lock:
+                    if server.clients >= server.max_clients:
+                        full = True
+                    else:
+                        full = False
+                        server.clients += 1
+                if full:
+                    self._send(503, 'text/plain', b'too many clients\n')
+                    return
+                try:
+                    self.connection.settimeout(server.send_timeout)
+                    self.send_response(200)
+                    self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                    self.send_header('Cache-Control', 'no-store')
+                    self.end_headers()
+                    seq = -1
+                    while not server._stop.is_set():
+                        new_seq, jpeg = server._next_jpeg(seq, timeout=1.0)
+                        if new_seq == seq or jpeg is None:
+                            continue
+                        seq = new_seq
+                        self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                         f'Content-Length: {len(jpeg)}\r\n\r\n'.encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b'\r\n')
+                except socket.timeout:
+                    server.dropped_clients += 1
+                    print(f"[Monitor] Dropped slow client {self.client_address[0]}")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._lock:
+                        server.clients -= 1
+
+        return Handler
@@ -0,0 +1,176 @@
+import os
+import time
+import datetime
+
+import cv2
+
+# Pipeline stages timed once per frame, in loop order
+STAGES = ('capture', 'resize', 'inference', 'roi', 'overlay', 'display', 'recording', 'serial', 'frame')
+COUNTERS = ('frames_total', 'frames_dropped', 'inferences_skipped', 'serial_commands_sent',
+            'deadlines_missed', 'renders_skipped')
+QUANTILES = (0.5, 0.95, 0.99)
+
+class StageStats:
+    """Rolling window of the most recent samples for one stage"""
+    def __init__(self, window):
+        self.samples = [0.0] * window
+        self.window = window
+        self.pos = 0
+        self.count = 0   # samples since start (not capped by window)
+        self.total = 0.0 # seconds since start
+
+    def add(self, seconds):
+        self.samples[self.pos] = seconds
+        self.pos = (self.pos + 1) % self.window
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, qs=QUANTILES):
+        """Return the requested quantiles (seconds) over the current window"""
+        n = min(self.count, self.window)
+        if n == 0:
+            return [0.0 for _ in qs]
+        window = sorted(self.samples[:n])
+        return [window[min(n - 1, int(q * n))] for q in qs]
+
+class PipelineMetrics:
+    """Per-stage frame timings, counters and periodic Prometheus/CSV export
+
+    The hot path only does a perf_counter() call and a few list writes per
+    stage; sorting for percentiles happens on export or when the on-screen
+    stats are refreshed.
+    """
+    def __init__(self, export_dir=None, export_interval=10.0, window=1024, overlay_refresh=0.5):
+        self.stats = {name: StageStats(window) for name in STAGES}
+        self.counters = {name: 0 for name in COUNTERS}
+        self.export_dir = export_dir
+        self.export_interval = export_interval
+        self.overlay_refresh = overlay_refresh
+        self._index = {name: i for i, name in enumerate(STAGES)}
+        self._acc = [0.0] * len(STAGES)
+        self._hit = [False] * len(STAGES)
+        self._frame_start = None
+        self._last_export = time.monotonic()
+        self._overlay_lines = []
+        self._overlay_time = 0.0
+        if export_dir and not os.path.exists(export_dir):
+            try:
+                os.makedirs(export_dir)
+            except Exception as e:
+                print(f"[Warning] Failed to create metrics directory: {e}")
+
+    def begin_frame(self):
+        """Start timing a frame; returns the start timestamp for the first lap"""
+        for i in range(len(self._acc)):
+            self._acc[i] = 0.0
+            self._hit[i] = False
+        self._frame_start = time.perf_counter()
+        return self._frame_start
+
+    def lap(self, stage, t0):
+        """Charge the time since `t0` to `stage` and return the current timestamp"""
+        now = time.perf_counter()
+        i = self._index[stage]
+        self._acc[i] += now - t0
+        self._hit[i] = True
+        return now
+
+    def end_frame(self):
+        """Commit this frame's stage totals to the rolling windows"""
+        if self._frame_start is None:
+            return
+        self.lap('frame', self._frame_start)
+        for name, i in self._index.items():
+            if self._hit[i]:
+                self.stats[name].add(self._acc[i])
+        self._frame_start = None
+        self.counters['frames_total'] += 1
+
+    def incr(self, counter, n=1):
+        self.counters[counter] += n
+
+    def snapshot(self):
+        """Return {stage: {p50, p95, p99, count, sum}} in seconds, plus counters"""
+        stages = {}
+        for name, st in self.stats.items():
+            p50, p95, p99 = st.quantiles()
+            stages[name] = {'p50': p50, 'p95': p95, 'p99': p99, 'count': st.count, 'sum': st.total}
+        return {'stages': stages, 'counters': dict(self.counters)}
+
+    def draw_overlay(self, frame, origin=(10, 24)):
+        """Draw per-stage p50/p95/p99 (ms) onto `frame` in place"""
+        now = time.monotonic()
+        if now - self._overlay_time >= self.overlay_refresh:
+            self._overlay_time = now
+            snap = self.snapshot()
+            lines = []
+            for name, s in snap['stages'].items():
+                if s['count']:
+                    lines.append(f"{name:<9} {s['p50']*1e3:6.1f} {s['p95']*1e3:6.1f} {s['p99']*1e3:6.1f} ms")
+            c = snap['counters']
+            lines.append(f"dropped {c['frames_dropped']}  skipped {c['inferences_skipped']}  serial {c['serial_commands_sent']}")
+            lines.append(f"missed deadlines {c['deadlines_missed']}  skipped renders {c['renders_skipped']}")
+            self._overlay_lines = lines
+        x, y = origin
+        for line in self._overlay_lines:
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (0, 0, 0), 3)
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_PLAIN, 1.1, (255, 255, 255), 1)
+            y += 20
+        return frame
+
+    def maybe_export(self):
+        """Export if the export interval has elapsed"""
+        if not self.export_dir or not self.export_interval or self.export_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.export()
+
+    def export(self):
+        """Write guideway_metrics.prom (replaced atomically) and append a row to guideway_metrics.csv"""
+        if not self.export_dir:
+            return
+        snap = self.snapshot()
+        try:
+            self._write_prometheus(snap)
+            self._append_csv(snap)
+        except Exception as e:
+            print(f"[Warning] Failed to export metrics: {e}")
+
+    def _write_prometheus(self, snap):
+        lines = [
+            '# HELP guideway_stage_seconds Per-frame time spent in each pipeline stage.',
+            '# TYPE guideway_stage_seconds summary',
+        ]
+        for name, s in snap['stages'].items():
+            for q in QUANTILES:
+                key = 'p' + str(int(round(q * 100)))
+                lines.append(f'guideway_stage_seconds{{stage="{name}",quantile="{q}"}} {s[key]:.6f}')
+            lines.append(f'guideway_stage_seconds_sum{{stage="{name}"}} {s["sum"]:.6f}')
+            lines.append(f'guideway_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        for name, value in snap['counters'].items():
+            lines.append(f'# TYPE guideway_{name} counter')
+            lines.append(f'guideway_{name} {value}')
+        path = os.path.join(self.export_dir, 'guideway_metrics.prom')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)
+
+    def _append_csv(self, snap):
+        path = os.path.join(self.export_dir, 'guideway_metrics.csv')
+        header = ['timestamp']
+        row = [datetime.datetime.now().isoformat(timespec='seconds')]
+        for name, s in snap['stages'].items():
+            for key in ('p50', 'p95', 'p99'):
+                header.append(f'{name}_{key}_ms')
+                row.append(f'{s[key]*1e3:.3f}')
+        for name, value in snap['counters'].items():
+            header.append(name)
+            row.append(str(value))
+        new_file = not os.path.exists(path)
+        with open(path, 'a') as f:
+            if new_file:
+                f.write(','.join(header) + '\n')
+            f.write(','.join(row) + '\n')
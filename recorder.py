@@ -0,0 +1,500 @@
+"""Metadata-first recording and annotated playback/export
+
+Recorder encodes frames on a writer thread and writes a JSONL sidecar next
+to the video (`recording_<time>.mp4` + `recording_<time>.jsonl`). The first
+sidecar line is a header (fps, sizes, mask name and entry); every
+following line describes one video frame:
+
+    {"f": 12, "t": 1760000000.123, "boxes": [[x1, y1, x2, y2, conf, in_roi]], "detected": 1, "motor": "0", "speed": 200}
+
+When the recording closes, an index (`recording_<time>.index.json`) maps
+wall-clock time to frame numbers (one mark per second) and lists the
+detection events (`detected`, `cleared`, `stop`, `run`) with their frame,
+time and the keyframe at or before them. Frames are encoded with a keyframe
+every `keyframe_interval` frames (every frame for MJPG), so a clip around
+an event is cut by seeking straight to that keyframe.
+
+Boxes are in capture pixels. In `raw` mode the video holds the unannotated
+stream (optionally downscaled or with a faster codec), and annotations are
+drawn on demand, optionally re-evaluated with other thresholds or masks:
+
+    python recorder.py play recordings/recording_20261018_101500.mp4
+    python recorder.py play recordings/recording_20261018_101500.mp4 --conf 0.6 --overlap 0.3 --all-boxes
+    python recorder.py export recordings/recording_20261018_101500.mp4 annotated.mp4 --mask region-2
+    python recorder.py events recordings/recording_20261018_101500.mp4
+    python recorder.py clip recordings/recording_20261018_101500.mp4 stop.mp4 --event 3 --before 5 --after 5
+    python recorder.py clip recordings/recording_20261018_101500.mp4 at.mp4 --time 2026-10-18T10:32:05
+    python recorder.py thumbs recordings/ thumbs/ --event stop --workers 4
+"""
+import os
+import glob
+import json
+import time
+import queue
+import argparse
+import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from region_geometry import rasterize
+from resource_governor import pin_thread
+
+RECORDING_MODES = ('annotated', 'raw')
+# container to use for each codec
+FOURCC_EXTENSIONS = {'mp4v': '.mp4', 'avc1': '.mp4', 'MJPG': '.avi', 'XVID': '.avi'}
+INTRA_ONLY = ('MJPG',)
+# OpenCV's FFmpeg writer emits an intra frame every 12 frames unless told otherwise
+DEFAULT_KEYFRAME_INTERVAL = 12
+EVENTS = ('detected', 'cleared', 'stop', 'run')
+
+def sidecar_path(video_path):
+    return os.path.splitext(video_path)[0] + '.jsonl'
+
+def index_path(video_path):
+    return os.path.splitext(video_path)[0] + '.index.json'
+
+class RecordingIndex:
+    """Builds a recording's time marks and detection events from its frame records"""
+    def __init__(self, video, fps, keyframe_interval, started=None):
+        self.data = {'video': video, 'fps': fps, 'keyframe_interval': keyframe_interval,
+                     'started': started, 'ended': None, 'frames': 0, 'times': [], 'events': []}
+        self._next_mark = None
+        self._detected = 0
+        self._motor = None
+
+    def keyframe(self, f):
+        k = self.data['keyframe_interval'] or 1
+        return f - f % k
+
+    def add(self, record):
+        f, t = record['f'], record['t']
+        if self._next_mark is None or t >= self._next_mark:
+            self.data['times'].append([round(t, 3), f])
+            self._next_mark = (self._next_mark or t) + 1.0
+        detected, motor = int(record.get('detected') or 0), record.get('motor')
+        if detected != self._detected:
+            self._event('detected' if detected else 'cleared', f, t)
+        if motor is not None and self._motor is not None and motor != self._motor:
+            self._event('stop' if motor == '0' else 'run', f, t)
+        self._detected = detected
+        self._motor = motor if motor is not None else self._motor
+        self.data['frames'] = f + 1
+        self.data['ended'] = t
+
+    def _event(self, kind, f, t):
+        self.data['events'].append({'event': kind, 'f': f, 't': t, 'keyframe': self.keyframe(f)})
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.data, fh, separators=(',', ':'))
+
+class Recorder:
+    """Video writer thread plus per-frame JSONL sidecar
+
+    `write()` copies (and downscales) the frame into one of `buffers`
+    preallocated buffers and returns; encoding happens on the writer thread.
+    If every buffer is still queued the frame is dropped and counted, so a
+    slow encoder never stalls the detection loop.
+    """
+    def __init__(self, path, fps, frame_size, mode='annotated', scale=1.0, fourcc='mp4v',
+                 header=None, buffers=8, resources=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.path = path
+        self.mode = mode
+        self.frame_size = frame_size
+        w, h = frame_size
+        self.size = (max(2, int(round(w * scale / 2)) * 2), max(2, int(round(h * scale / 2)) * 2))
+        self.frames = 0
+        self.dropped = 0
+        self._resources = resources
+        self._writer, self.keyframe_interval = self._open_writer(path, fourcc, fps, keyframe_interval)
+        self._sidecar = open(sidecar_path(path), 'w', encoding='utf-8')
+        head = {'video': os.path.basename(path), 'mode': mode, 'fps': fps, 'frame_size': list(frame_size),
+                'video_size': list(self.size), 'fourcc': fourcc, 'keyframe_interval': self.keyframe_interval,
+                'started': round(time.time(), 4)}
+        head.update(header or {})
+        self._index = RecordingIndex(head['video'], fps, self.keyframe_interval, head['started'])
+        self._sidecar.write(json.dumps(head, separators=(',', ':')) + '\n')
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(np.empty((self.size[1], self.size[0], 3), dtype=np.uint8))
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+        self._thread.start()
+
+    def _open_writer(self, path, fourcc, fps, keyframe_interval):
+        code = cv2.VideoWriter_fourcc(*fourcc)
+        if fourcc in INTRA_ONLY:
+            keyframe_interval = 1
+        # the key-interval property only exists in newer OpenCV builds (FFmpeg backend)
+        prop = getattr(cv2, 'VIDEOWRITER_PROP_KEY_INTERVAL', None)
+        if keyframe_interval > 1 and prop is not None:
+            writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, code, float(fps), self.size, [prop, int(keyframe_interval)])
+            if writer.isOpened():
+                return writer, keyframe_interval
+            writer.release()
+        writer = cv2.VideoWriter(path, code, float(fps), self.size)
+        if not writer.isOpened():
+            raise RuntimeError(f"Failed to open video writer for {path}")
+        if keyframe_interval not in (1, DEFAULT_KEYFRAME_INTERVAL):
+            print(f"[Warning] This OpenCV cannot set the keyframe interval; using {DEFAULT_KEYFRAME_INTERVAL}")
+            keyframe_interval = DEFAULT_KEYFRAME_INTERVAL
+        return writer, keyframe_interval
+
+    def write(self, frame, **meta):
+        """Queue a frame and its sidecar fields; returns False if it was dropped"""
+        try:
+            buf = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        if frame.shape[1] == self.size[0] and frame.shape[0] == self.size[1]:
+            np.copyto(buf, frame)
+        else:
+            cv2.resize(frame, self.size, dst=buf, interpolation=cv2.INTER_AREA)
+        meta['f'] = self.frames
+        meta['t'] = round(time.time(), 4)
+        self.frames += 1
+        self._queue.put((buf, meta))
+        return True
+
+    def close(self):
+        """Encode queued frames, then close the video and sidecar and write the index"""
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.release()
+        self._sidecar.close()
+        try:
+            self._index.save(index_path(self.path))
+        except Exception as e:
+            print(f"[Warning] Failed to write recording index: {e}")
+        if self.dropped:
+            print(f"[Recording] {self.dropped} frames dropped (encoder behind)")
+
+    def _run(self):
+        if self._resources:
+            pin_thread(self._resources, 'recording')
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            buf, meta = item
+            try:
+                self._writer.write(buf)
+                self._sidecar.write(json.dumps(meta, separators=(',', ':')) + '\n')
+                self._index.add(meta)
+            except Exception as e:
+                print(f"[Warning] Failed to write recording frame: {e}")
+            self._free.put(buf)
+
+def read_sidecar(video_path):
+    """(header, {frame number: record}) from a recording's sidecar"""
+    header, frames = {}, {}
+    with open(sidecar_path(video_path), 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn final line
+            if i == 0:
+                header = record
+            else:
+                frames[record['f']] = record
+    return header, frames
+
+class Annotator:
+    """Draws the ROI overlay, boxes and motor state of one sidecar record
+
+    With `conf`/`overlap`/`entry`, boxes are re-evaluated against the given
+    thresholds or mask instead of the recorded in_roi flags.
+    """
+    def __init__(self, header, video_size, entry=None, conf=None, overlap=None, all_boxes=False, overlay=True):
+        w, h = video_size
+        fw, fh = header.get('frame_size', video_size)
+        self.sx, self.sy = w / fw, h / fh
+        self.entry = entry if entry is not None else header.get('mask_entry', {})
+        self.mask = rasterize(self.entry, int(fw), int(fh)) if (entry is not None or overlap is not None) else None
+        self.conf = conf
+        self.overlap = overlap if overlap is not None else header.get('overlap_threshold', 0.1)
+        self.all_boxes = all_boxes
+        small = rasterize(self.entry, w, h)
+        self._where = (small > 0)[:, :, np.newaxis] if overlay else None
+        self._tint = np.empty((h, w, 3), dtype=np.uint8)
+        self._tint[:] = (0, 0, 255)
+
+    def in_roi(self, box):
+        x1, y1, x2, y2, conf, in_roi = box[:6]
+        if self.conf is not None and conf < self.conf:
+            return None  # below the confidence threshold: not a detection at all
+        if self.mask is None:
+            return bool(in_roi)
+        region = self.mask[int(y1):int(y2), int(x1):int(x2)]
+        return region.size > 0 and np.count_nonzero(region) / region.size >= self.overlap
+
+    def draw(self, frame, record):
+        if self._where is not None:
+            blend = cv2.addWeighted(frame, 0.5, self._tint, 0.5, 0)
+            np.copyto(frame, blend, where=self._where)
+        detected = False
+        for box in (record or {}).get('boxes', []):
+            hit = self.in_roi(box)
+            if hit is None or (not hit and not self.all_boxes):
+                continue
+            detected = detected or hit
+            x1, y1, x2, y2 = (int(box[0] * self.sx), int(box[1] * self.sy), int(box[2] * self.sx), int(box[3] * self.sy))
+            color = (0, 255, 0) if hit else (160, 160, 160)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 4 if hit else 1)
+            cv2.putText(frame, f'Conf: {box[4]:.2f}', (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        if record:
+            motor = 'RUN' if record.get('motor') == '1' else 'STOP'
+            cv2.putText(frame, f"#{record['f']} motor {motor}{' DETECTED' if detected else ''}", (10, frame.shape[0] - 12),
+                        cv2.FONT_HERSHEY_PLAIN, 1.4, (255, 255, 255), 2)
+        return frame
+
+def load_index(video_path):
+    """The recording's index, rebuilt from its sidecar if missing (e.g. after a crash)"""
+    path = index_path(video_path)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    header, frames = read_sidecar(video_path)
+    index = RecordingIndex(header.get('video', os.path.basename(video_path)), header.get('fps'),
+                           header.get('keyframe_interval', 1 if header.get('fourcc') in INTRA_ONLY
+                                      else DEFAULT_KEYFRAME_INTERVAL), header.get('started'))
+    for f in sorted(frames):
+        index.add(frames[f])
+    try:
+        index.save(path)
+        print(f"[Recording] Rebuilt index: {path}")
+    except OSError as e:
+        print(f"[Warning] Failed to save rebuilt index: {e}")
+    return index.data
+
+def frame_at(index, t):
+    """Frame shown at wall-clock time `t` (epoch seconds), from the per-second marks"""
+    marks = index['times']
+    if not marks:
+        return 0
+    t0, f0 = marks[0]
+    for mt, mf in marks:
+        if mt > t:
+            break
+        t0, f0 = mt, mf
+    return max(0, min(index['frames'] - 1, f0 + int(round((t - t0) * (index['fps'] or 30)))))
+
+def _parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+def _seek(cap, index, f):
+    """Position `cap` at frame `f` by jumping to its keyframe and decoding forward"""
+    k = index.get('keyframe_interval') or 1
+    start = f - f % k
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) if start else 0
+    for _ in range(max(0, f - pos)):
+        if not cap.grab():
+            return False
+    return True
+
+def _annotator(args, header, video_size):
+    entry = None
+    if args.mask:
+        with open(args.regions, 'r') as f:
+            entry = json.load(f)[args.mask]
+    return Annotator(header, video_size, entry=entry, conf=args.conf, overlap=args.overlap,
+                     all_boxes=args.all_boxes, overlay=not args.no_overlay)
+
+def play(args):
+    header, frames = read_sidecar(args.video)
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open {args.video}")
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    annotator = _annotator(args, header, size)
+    delay = max(1, int(1000 / (header.get('fps') or 30)))
+    n = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        cv2.imshow(os.path.basename(args.video), annotator.draw(frame, frames.get(n)))
+        n += 1
+        key = cv2.waitKey(delay) & 0xFF
+        if key in (ord('q'), 27):
+            break
+        if key == ord(' '):
+            cv2.waitKey(0)
+    cap.release()
+    cv2.destroyAllWindows()
+
+def export(args):
+    header, frames = read_sidecar(args.video)
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open {args.video}")
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    annotator = _annotator(args, header, size)
+    writer = cv2.VideoWriter(args.out, cv2.VideoWriter_fourcc(*args.fourcc), float(header.get('fps') or 30), size)
+    n = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        writer.write(annotator.draw(frame, frames.get(n)))
+        n += 1
+    cap.release()
+    writer.release()
+    print(f"[Recording] Exported {n} frames to {args.out}")
+
+def events(args):
+    index = load_index(args.video)
+    print(f"[Recording] {index['video']}: {index['frames']} frames, keyframe every {index['keyframe_interval']}")
+    for i, e in enumerate(index['events']):
+        if args.event and e['event'] != args.event:
+            continue
+        when = datetime.datetime.fromtimestamp(e['t']).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        print(f"{i:4d}  {e['event']:<9} frame {e['f']:7d}  keyframe {e['keyframe']:7d}  {when}")
+
+def clip(args):
+    index = load_index(args.video)
+    if args.event is not None:
+        center = index['events'][args.event]['f']
+    elif args.time is not None:
+        center = frame_at(index, _parse_time(args.time))
+    else:
+        center = args.frame
+    fps = index['fps'] or 30
+    first = max(0, center - int(args.before * fps))
+    last = min(index['frames'] - 1, center + int(args.after * fps))
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open {args.video}")
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    annotator = frames = None
+    if args.annotate:
+        header, frames = read_sidecar(args.video)
+        if header.get('mode') == 'raw':  # annotated recordings already show them
+            annotator = Annotator(header, size)
+    writer = cv2.VideoWriter(args.out, cv2.VideoWriter_fourcc(*args.fourcc), float(fps), size)
+    n = 0
+    if _seek(cap, index, first):
+        for f in range(first, last + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(annotator.draw(frame, frames.get(f)) if annotator else frame)
+            n += 1
+    cap.release()
+    writer.release()
+    print(f"[Recording] Clip of frames {first}-{first + n - 1} (around {center}) saved: {args.out}")
+
+def _thumbnails(video, out_dir, kind, width, annotate):
+    """Write one JPEG per `kind` event of one recording; runs in a worker process"""
+    index = load_index(video)
+    wanted = [e for e in index['events'] if e['event'] == kind]
+    if not wanted:
+        return video, 0
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        return video, 0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    annotator = frames = None
+    if annotate:
+        header, frames = read_sidecar(video)
+        if header.get('mode') == 'raw':
+            annotator = Annotator(header, size)
+    stem = os.path.splitext(os.path.basename(video))[0]
+    written = 0
+    for e in wanted:
+        if not _seek(cap, index, e['f']):
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        if annotator:
+            annotator.draw(frame, frames.get(e['f']))
+        if width and frame.shape[1] > width:
+            frame = cv2.resize(frame, (width, int(round(frame.shape[0] * width / frame.shape[1]))),
+                               interpolation=cv2.INTER_AREA)
+        cv2.imwrite(os.path.join(out_dir, f"{stem}_{kind}_f{e['f']:07d}.jpg"), frame)
+        written += 1
+    cap.release()
+    return video, written
+
+def thumbs(args):
+    videos = sorted(p for p in glob.glob(os.path.join(args.folder, 'recording_*'))
+                    if os.path.splitext(p)[1] in set(FOURCC_EXTENSIONS.values())
+                    and os.path.exists(sidecar_path(p)))
+    if not videos:
+        print(f"[Recording] No recordings with a sidecar in {args.folder}")
+        return
+    os.makedirs(args.out, exist_ok=True)
+    total = 0
+    with ProcessPoolExecutor(max_workers=args.workers or None) as pool:
+        jobs = [pool.submit(_thumbnails, v, args.out, args.event, args.width, not args.no_annotate) for v in videos]
+        for job in jobs:
+            try:
+                video, n = job.result()
+            except Exception as e:
+                print(f"[Warning] Thumbnail export failed: {e}")
+                continue
+            total += n
+            print(f"[Recording] {os.path.basename(video)}: {n} {args.event} thumbnails")
+    print(f"[Recording] {total} thumbnails from {len(videos)} recordings saved to {args.out}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play, export, index and cut recordings using their sidecar")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('events', help="list a recording's detection events")
+    p.add_argument('video')
+    p.add_argument('--event', choices=EVENTS, default=None, help='only this kind of event')
+    p = sub.add_parser('clip', help='cut a clip around an event, time or frame')
+    p.add_argument('video')
+    p.add_argument('out')
+    where = p.add_mutually_exclusive_group(required=True)
+    where.add_argument('--event', type=int, help='event number from `events`')
+    where.add_argument('--time', help='wall-clock time: epoch seconds or ISO 8601 (local time)')
+    where.add_argument('--frame', type=int)
+    p.add_argument('--before', type=float, default=5.0, help='seconds before')
+    p.add_argument('--after', type=float, default=5.0, help='seconds after')
+    p.add_argument('--annotate', action='store_true', help='draw boxes and the ROI from the sidecar')
+    p.add_argument('--fourcc', default='mp4v')
+    p = sub.add_parser('thumbs', help='export event thumbnails for every recording in a folder')
+    p.add_argument('folder')
+    p.add_argument('out')
+    p.add_argument('--event', choices=EVENTS, default='stop')
+    p.add_argument('--width', type=int, default=480, help='downscale thumbnails to this width (0 keeps size)')
+    p.add_argument('--workers', type=int, default=0, help='processes (default: CPU count)')
+    p.add_argument('--no-annotate', action='store_true', help='save frames without boxes and ROI')
+    for name in ('play', 'export'):
+        p = sub.add_parser(name)
+        p.add_argument('video', help='recording (its .jsonl sidecar must sit next to it)')
+        if name == 'export':
+            p.add_argument('out', help='annotated output video')
+            p.add_argument('--fourcc', default='mp4v')
+        p.add_argument('--conf', type=float, default=None, help='re-apply a confidence threshold')
+        p.add_argument('--overlap', type=float, default=None, help='re-evaluate ROI overlap with this threshold')
+        p.add_argument('--mask', default=None, help='re-evaluate against this mask from --regions')
+        p.add_argument('--regions', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regions.json'))
+        p.add_argument('--all-boxes', action='store_true', help='also draw boxes outside the ROI')
+        p.add_argument('--no-overlay', action='store_true', help='do not draw the ROI overlay')
+    args = parser.parse_args(argv)
+    if args.command == 'play':
+        play(args)
+    elif args.command == 'export':
+        export(args)
+    elif args.command == 'events':
+        events(args)
+    elif args.command == 'clip':
+        clip(args)
+    else:
+        thumbs(args)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,4 +1,5 @@
 import os 
+import sys
 
 os.environ["OPENCV_VIDEOIO_MSMF_ENABLE_HW_TRANSFORMS"] = "0" # Fix for external camera took long time to load
 
@@ -6,68 +7,225 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import sv_ttk
 import cv2
+import numpy as np
 from PIL import Image, ImageTk, ImageDraw
 import json
-import copy
+import threading
+import time
+from collections import deque
+from frame_source import open_source
+from region_geometry import mask_resolution, region_polygons, scale_points, simplify
 
 # Path to regions JSON file
 REGIONS_JSON_PATH = os.path.join(os.path.dirname(__file__), 'regions.json')
+# Maximum number of undo steps kept in memory
+UNDO_HISTORY_DEPTH = 100
+# Edits are written to regions.json once no further edit arrives for this long
+SAVE_DEBOUNCE_MS = 500
+# Drawing canvas / background size
+FRAME_WIDTH, FRAME_HEIGHT = 1280, 720
+# Background source: camera index/device path, video file, image directory or stream URL
+VIDEO_SOURCE = 0
+# Frames discarded while the camera settles exposure
+WARMUP_FRAMES = 20
+# Live background repaint interval (the camera itself is read at full rate)
+BACKGROUND_REFRESH_MS = 200
+# Finished polygons are simplified to at most this many vertices (0 keeps every click)
+MAX_REGION_VERTICES = 32
+
+def _apply_change(data, mask, region, value):
+    """Set data[mask] (region None) or data[mask]['regions'][region] to value; None removes it"""
+    if region is None:
+        if value is None:
+            data.pop(mask, None)
+        else:
+            data[mask] = value
+    else:
+        regions = data[mask]['regions']
+        if value is None:
+            regions.pop(region, None)
+        else:
+            regions[region] = value
+
+# RGBA fills for regions and the selected region
+REGION_FILL = (255, 0, 0, 80)
+HIGHLIGHT_FILL = (0, 255, 0, 80)
+
+class FillLayer:
+    """All semi-transparent region fills composited into one cached RGBA layer
+
+    Adding, removing or highlighting a region re-renders only that region's
+    bounding box, and the canvas shows the layer through a single PhotoImage.
+    """
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        self.photo = ImageTk.PhotoImage(self.image)
+        self.regions = {}  # name -> flat [x1, y1, x2, y2, ...]
+        self.highlight = None
+        self._dirty = False
+
+    def _bbox(self, coords):
+        xs, ys = coords[0::2], coords[1::2]
+        return (max(0, int(min(xs))), max(0, int(min(ys))),
+                min(self.width, int(max(xs)) + 2), min(self.height, int(max(ys)) + 2))
+
+    def _render(self, box):
+        # redraw everything that touches `box` into a patch and paste it back
+        x0, y0, x1, y1 = box
+        if x1 <= x0 or y1 <= y0:
+            return
+        patch = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(patch)
+        for coords in self.regions.values():
+            bx0, by0, bx1, by1 = self._bbox(coords)
+            if bx0 < x1 and bx1 > x0 and by0 < y1 and by1 > y0:
+                draw.polygon([c - (x0 if i % 2 == 0 else y0) for i, c in enumerate(coords)], fill=REGION_FILL)
+        coords = self.regions.get(self.highlight)
+        if coords:
+            # highlight is blended over the red fill, as separate overlays used to be
+            glow = Image.new("RGBA", patch.size, (0, 0, 0, 0))
+            ImageDraw.Draw(glow).polygon([c - (x0 if i % 2 == 0 else y0) for i, c in enumerate(coords)],
+                                         fill=HIGHLIGHT_FILL)
+            patch = Image.alpha_composite(patch, glow)
+        self.image.paste(patch, (x0, y0))
+        self._dirty = True
+
+    def set_regions(self, regions):
+        """Replace all regions ({name: [(x, y), ...]}) and clear the highlight"""
+        self.regions = {name: [c for p in pts for c in p] for name, pts in regions.items()}
+        self.highlight = None
+        self._render((0, 0, self.width, self.height))
+        self.flush()
+
+    def add(self, name, pts):
+        self.regions[name] = [c for p in pts for c in p]
+        self._render(self._bbox(self.regions[name]))
+        self.flush()
+
+    def remove(self, name):
+        coords = self.regions.pop(name, None)
+        if self.highlight == name:
+            self.highlight = None
+        if coords:
+            self._render(self._bbox(coords))
+        self.flush()
+
+    def set_highlight(self, name):
+        old = self.regions.get(self.highlight)
+        self.highlight = name
+        if old:
+            self._render(self._bbox(old))
+        if name in self.regions:
+            self._render(self._bbox(self.regions[name]))
+        self.flush()
+
+    def flush(self):
+        if self._dirty:
+            self.photo.paste(self.image)
+            self._dirty = False
+
+class CaptureThread(threading.Thread):
+    """Reads the video source off the Tk thread and keeps only the latest frame
+
+    Warm-up happens here too, so the window can open immediately. A source
+    that cannot be opened is reported through `error` for the UI to show;
+    live sources that drop out reconnect on their own, and files loop.
+    """
+    def __init__(self, source=VIDEO_SOURCE, size=(FRAME_WIDTH, FRAME_HEIGHT), warmup_frames=WARMUP_FRAMES):
+        super().__init__(name='region-capture', daemon=True)
+        self.source = source
+        self.size = size
+        self.warmup_frames = warmup_frames
+        self.error = None
+        self._frame = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            source = open_source(self.source, *self.size, loop=True)
+        except Exception as e:
+            self.error = f"Cannot open video source: {e}"
+            return
+        if not source.isOpened():
+            self.error = f"Cannot open video source: {self.source}"
+            return
+        try:
+            # Capture several frames to allow the camera to adjust exposure
+            warmup = self.warmup_frames if source.live else 0
+            while not self._stop_event.is_set():
+                ret, frame = source.read()
+                if not ret:
+                    time.sleep(0.05)  # reconnecting, or decoder behind
+                    continue
+                if warmup:
+                    warmup -= 1
+                    continue
+                # Downscale frame to the canvas size (width x height) unless it already matches
+                if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+                else:
+                    frame = frame.copy()  # the source reuses its buffers
+                with self._lock:
+                    self._frame = frame
+                    self._seq += 1
+                if not source.live:
+                    time.sleep(1.0 / (source.fps or 30.0))  # play files at their own rate
+        finally:
+            source.release()
+
+    def latest(self):
+        """Return (sequence number, frame); the frame is None until warm-up finishes"""
+        with self._lock:
+            return self._seq, self._frame
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=2)
 
 class RegionCreatorApp:
-    def push_undo(self):
-        
-        self.undo_stack.append((copy.deepcopy(self.data), self.model_var.get()))
+    def record_edit(self, changes, model_before):
+        """Record an edit that has already been applied to self.data
+
+        `changes` is a list of (mask, region, before, after) tuples holding only
+        the touched mask entry (region None) or region points; before/after
+        None means absent. Entries are replaced, never mutated, so the stored
+        objects stay valid for undo/redo.
+        """
+        self.undo_stack.append((changes, model_before, self.model_var.get()))
         self.redo_stack.clear()
+        for mask, _, _, _ in changes:
+            self._dirty_masks.add(mask)
+        self.schedule_save()
         self._update_undo_redo_buttons()
 
-    def __init__(self, root):
+    def __init__(self, root, history_depth=UNDO_HISTORY_DEPTH, source=VIDEO_SOURCE):
 
         self.root = root
         root.title("Region Creator")
         #root.resizable(False, False)
         # Apply Sun Valley ttk theme (dark)
         sv_ttk.set_theme("light")
-        # Undo/Redo stacks
-        self.undo_stack = []
+        # Undo/Redo stacks of change lists (oldest entries drop off at history_depth)
+        self.undo_stack = deque(maxlen=history_depth)
         self.redo_stack = []
-        # storage for semi-transparent fill overlays
-        self.region_fill_images = {}
-        self.highlight_fill_image = None
+        # Debounced, incremental saving: serialized JSON is cached per mask
+        self._save_job = None
+        self._dirty_masks = set()
+        self._mask_json = {}
         # Load existing data
         self.data = {}
         self.load_json()
-        # Initialize webcam
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            messagebox.showerror("Error", "Cannot open webcam")
-            root.destroy()
-            return
-            
-        # Add a camera warm-up period to allow for auto-adjustment (silently)
-        # Capture several frames to allow the camera to adjust exposure
-        WARMUP_FRAMES = 20
-        for i in range(WARMUP_FRAMES):
-            ret, frame = self.cap.read()
-            if not ret:
-                messagebox.showerror("Error", "Cannot read from webcam")
-                root.destroy()
-                return
-            # Short delay between frames
-            root.after(100)
-            
-        # Read one more frame now that camera has adjusted
-        ret, frame = self.cap.read()
-        if not ret:
-            messagebox.showerror("Error", "Cannot read from webcam")
-            root.destroy()
-            return
-            
-        # Downscale frame to 720p (width x height)
-        frame = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
-        self.frame_h, self.frame_w = frame.shape[:2]
-        # Convert to PhotoImage
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.bg_image = ImageTk.PhotoImage(Image.fromarray(img))
+        # Start the webcam (open + warm-up) in the background so the window opens immediately
+        self.capture = CaptureThread(source)
+        self.capture.start()
+        self.frame_w, self.frame_h = FRAME_WIDTH, FRAME_HEIGHT
+        # One persistent background image, repainted in place as frames arrive
+        self.bg_image = ImageTk.PhotoImage(Image.new("RGB", (self.frame_w, self.frame_h)))
+        self.bg_seq = 0
+        self.freeze_var = tk.BooleanVar(value=False)
         # State
         self.start_x = self.start_y = None
         self.current_points = []
@@ -75,8 +233,8 @@ class RegionCreatorApp:
         self.rect = None
         # Build UI
         self.setup_ui()
-        # Only use initial frame for drawing; disable live update
-        # self.update_webcam()
+        # Live, throttled background (toggle "Freeze Frame" to hold the current frame)
+        self.update_webcam()
         # Keyboard shortcuts for undo/redo, add region, and delete region
         self.root.bind('<Control-z>', self._on_ctrl_z)
         self.root.bind('<Control-y>', self._on_ctrl_y)
@@ -97,10 +255,38 @@ class RegionCreatorApp:
                 self.data = {}
         else:
             self.data = {}
+        self._mask_json.clear()
+
+    def schedule_save(self):
+        """Save after SAVE_DEBOUNCE_MS without further edits"""
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+        self._save_job = self.root.after(SAVE_DEBOUNCE_MS, self.save_json)
 
     def save_json(self):
-        with open(REGIONS_JSON_PATH, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+            self._save_job = None
+        # Re-serialize only masks edited since the last save; output matches json.dump(indent=2)
+        for mask in self._dirty_masks:
+            self._mask_json.pop(mask, None)
+            if mask in self.data:
+                self.data[mask].pop('meta', None)  # unused per-region metadata from older files
+        self._dirty_masks.clear()
+        parts = []
+        for mask, entry in self.data.items():
+            text = self._mask_json.get(mask)
+            if text is None:
+                text = json.dumps(mask) + ': ' + json.dumps(entry, indent=2).replace('\n', '\n  ')
+                self._mask_json[mask] = text
+            parts.append(text)
+        for mask in set(self._mask_json) - set(self.data):
+            del self._mask_json[mask]
+        content = '{\n  ' + ',\n  '.join(parts) + '\n}' if parts else '{}'
+        tmp_path = REGIONS_JSON_PATH + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, REGIONS_JSON_PATH)
         #messagebox.showinfo("Saved", f"Regions saved to {REGIONS_JSON_PATH}.")
 
     def setup_ui(self):
@@ -172,18 +358,19 @@ class RegionCreatorApp:
         self._update_model_dependent_buttons()
 
     def add_model(self):
-        self.push_undo()
         name = simpledialog.askstring("New Model", "Enter mask name:")
         if not name:
             return
         if name in self.data:
             messagebox.showwarning("Warning", f"Model '{name}' already exists.")
             return
-        self.data[name] = {"regions": {}}
+        model_before = self.model_var.get()
+        entry = {"regions": {}, "resolution": [self.frame_w, self.frame_h]}
+        self.data[name] = entry
         models = list(self.data.keys())
         self.model_menu['values'] = models
         self.model_var.set(name)
-        self.save_json()
+        self.record_edit([(name, None, None, entry)], model_before)
         self.load_model()
 
     def _update_model_dependent_buttons(self):
@@ -197,31 +384,32 @@ class RegionCreatorApp:
         # Delete only enabled if there are regions
         self.del_btn.config(state=(tk.NORMAL if valid and regions_exist else tk.DISABLED))
 
+    def canvas_regions(self, model):
+        """{name: [(x, y), ...]} of the model's regions in canvas pixels"""
+        entry = self.data.get(model, {})
+        return {name: [(int(round(x)), int(round(y))) for x, y in poly]
+                for name, poly in region_polygons(entry, self.frame_w, self.frame_h).items()}
+
     def load_model(self):
         self.cancel_draw_mode()
         model = self.model_var.get()
         self.region_listbox.delete(0, tk.END)
         self.canvas.delete("region")
         self.canvas.delete("highlight")
-        self.canvas.delete("region_fill")
-        self.region_fill_images.clear()
         self._update_model_dependent_buttons()
         if not model or model not in self.data:
+            self.fill_layer.set_regions({})
             return
         cfg = self.data[model]
         for name in cfg.get("regions", {}):
             self.region_listbox.insert(tk.END, name)
-        for name, pts in cfg.get("regions", {}).items():
+        # stored geometry may be normalized or from another resolution; draw it at canvas scale
+        regions = self.canvas_regions(model)
+        # all fills go into the shared layer; outlines stay vector items above it
+        self.fill_layer.set_regions(regions)
+        for name, pts in regions.items():
             coords = [c for p in pts for c in p]
-            # draw region outline
-            poly_id = self.canvas.create_polygon(*coords, outline="red", width=2, fill="", tags=("region", name))
-            # draw semi-transparent fill overlay
-            overlay = Image.new("RGBA", (self.frame_w, self.frame_h), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-            draw.polygon(coords, fill=(255, 0, 0, 80))
-            overlay_tk = ImageTk.PhotoImage(overlay)
-            self.canvas.create_image(0, 0, image=overlay_tk, anchor="nw", tags=("region_fill", name))
-            self.region_fill_images[name] = overlay_tk
+            self.canvas.create_polygon(*coords, outline="red", width=2, fill="", tags=("region", name))
 
     def setup_ui(self):
         # Fixed-width control panel on left
@@ -270,12 +458,17 @@ class RegionCreatorApp:
         # Button to finalize freeform region
         self.finish_btn = ttk.Button(ctrl, text="Finish Region", command=self.finish_polygon, state=tk.DISABLED)
         self.finish_btn.pack(fill=tk.X, pady=2)
+        # Hold the background on the current frame while drawing
+        ttk.Checkbutton(ctrl, text="Freeze Frame", variable=self.freeze_var).pack(fill=tk.X, pady=(10,2))
         # Add Save and Close button
         ttk.Button(ctrl, text="Save and Close", command=self.save_and_close).pack(fill=tk.X, pady=(20,2))
         # Canvas for drawing
         self.canvas = tk.Canvas(self.root, width=self.frame_w, height=self.frame_h, cursor="cross")
         self.canvas.pack(side=tk.RIGHT)
         self.canvas.create_image(0, 0, image=self.bg_image, anchor='nw')
+        # single composited fill layer above the background, below region outlines
+        self.fill_layer = FillLayer(self.frame_w, self.frame_h)
+        self.canvas.create_image(0, 0, image=self.fill_layer.photo, anchor='nw', tags=('region_fill',))
         if not self.canvas_click_binding_set:
             self.canvas.bind('<Button-1>', self.on_canvas_click)
             self.canvas_click_binding_set = True
@@ -301,7 +494,6 @@ class RegionCreatorApp:
         self.finish_btn.config(state=tk.DISABLED)
 
     def rename_model(self):
-        self.push_undo()
         model = self.model_var.get()
         if not model or model not in self.data:
             messagebox.showwarning("Warning", "Select a valid model first.")
@@ -313,28 +505,28 @@ class RegionCreatorApp:
             messagebox.showwarning("Warning", f"Model '{new_name}' already exists.")
             return
         # Rename model key
-        self.data[new_name] = self.data.pop(model)
-        self.save_json()
+        entry = self.data.pop(model)
+        self.data[new_name] = entry
         models = list(self.data.keys())
         self.model_menu['values'] = models
         self.model_var.set(new_name)
+        self.record_edit([(model, None, entry, None), (new_name, None, None, entry)], model)
         self.load_model()
 
     def delete_model(self):
-        self.push_undo()
         self.cancel_draw_mode()
         model = self.model_var.get()
         if not model or model not in self.data:
             messagebox.showwarning("Warning", "Select a valid model first.")
             return
-        del self.data[model]
-        self.save_json()
+        entry = self.data.pop(model)
         models = list(self.data.keys())
         self.model_menu['values'] = models
         if models:
             self.model_var.set(models[0])
         else:
             self.model_var.set('')
+        self.record_edit([(model, None, entry, None)], model)
         self.load_model()
 
     def on_region_select(self, event):
@@ -348,19 +540,12 @@ class RegionCreatorApp:
         region_name = self.region_listbox.get(selection[0])
         # clear highlights
         self.canvas.delete('highlight')
-        self.canvas.delete('highlight_fill')
         pts = self.data[self.model_var.get()]['regions'].get(region_name)
+        self.fill_layer.set_highlight(region_name if pts else None)
         if pts:
-            coords = [c for p in pts for c in p]
+            coords = [c for p in self.canvas_regions(self.model_var.get())[region_name] for c in p]
             # draw highlight outline
             self.canvas.create_polygon(*coords, outline='green', width=3, fill="", tags='highlight')
-            # draw semi-transparent highlight overlay
-            overlay_h = Image.new("RGBA", (self.frame_w, self.frame_h), (0, 0, 0, 0))
-            draw_h = ImageDraw.Draw(overlay_h)
-            draw_h.polygon(coords, fill=(0, 255, 0, 80))
-            overlay_h_tk = ImageTk.PhotoImage(overlay_h)
-            self.canvas.create_image(0, 0, image=overlay_h_tk, anchor='nw', tags=("highlight_fill",))
-            self.highlight_fill_image = overlay_h_tk
             # Show region info with each coordinate on its own line
             lines = [region_name, 'Points:']
             for x, y in pts:
@@ -376,27 +561,23 @@ class RegionCreatorApp:
             self.region_info.config(state='disabled')
 
     def on_canvas_click(self, event):
-        # Use a small box around the click for easier selection
+        # Use a small margin around the outline for easier selection
         pad = 4
-        items = self.canvas.find_overlapping(event.x - pad, event.y - pad, event.x + pad, event.y + pad)
-        # Reverse to prioritize topmost
-        items = list(items)[::-1]
-        for item in items:
-            tags = self.canvas.gettags(item)
-            # Look for a region tag that is not just 'region'
-            region_tags = [t for t in tags if t != 'region' and t != 'highlight']
-            if region_tags:
-                region_name = region_tags[0]
-                # Select in listbox
-                for idx in range(self.region_listbox.size()):
-                    if self.region_listbox.get(idx) == region_name:
-                        self.region_listbox.select_clear(0, tk.END)
-                        self.region_listbox.select_set(idx)
-                        self.region_listbox.event_generate('<<ListboxSelect>>')
-                        return
+        regions = self.canvas_regions(self.model_var.get())
+        # Reverse to prioritize the most recently drawn (topmost) region
+        for region_name in reversed(list(regions)):
+            contour = np.array(regions[region_name], dtype=np.int32).reshape(-1, 1, 2)
+            if cv2.pointPolygonTest(contour, (float(event.x), float(event.y)), True) < -pad:
+                continue
+            # Select in listbox
+            for idx in range(self.region_listbox.size()):
+                if self.region_listbox.get(idx) == region_name:
+                    self.region_listbox.select_clear(0, tk.END)
+                    self.region_listbox.select_set(idx)
+                    self.region_listbox.event_generate('<<ListboxSelect>>')
+                    return
 
     def delete_region(self):
-        self.push_undo()
         model = self.model_var.get()
         if not model or model not in self.data:
             messagebox.showwarning("Warning", "Select a valid model first.")
@@ -406,24 +587,24 @@ class RegionCreatorApp:
             messagebox.showwarning("Warning", "Select a region first.")
             return
         region = self.region_listbox.get(selection[0])
-        del self.data[model]['regions'][region]
+        pts = self.data[model]['regions'].pop(region)
+        self.record_edit([(model, region, pts, None)], model)
         
-        # Always clear highlights before reloading the model
+        # Remove just this region: outline, highlight, list entry and its part of the fill layer
         self.canvas.delete('highlight')
-        self.canvas.delete('highlight_fill')
+        self.canvas.delete(region)
+        self.region_listbox.delete(selection[0])
+        self.fill_layer.remove(region)
         
         # Clear the region info text
         self.region_info.config(state='normal')
         self.region_info.delete('1.0', tk.END)
         self.region_info.config(state='disabled')
-        
-        self.save_json()
-        self.load_model()
+        self._update_model_dependent_buttons()
 
 
 
     def enable_draw(self):
-        self.push_undo()
         model = self.model_var.get()
         if not model:
             messagebox.showwarning("Warning", "Select or create a model first.")
@@ -463,16 +644,20 @@ class RegionCreatorApp:
         cx = sum(x for x, y in pts) / len(pts)
         cy = sum(y for x, y in pts) / len(pts)
         sorted_pts = sorted(pts, key=lambda p: math.atan2(p[1] - cy, p[0] - cx))
-        self.current_points = sorted_pts
-        # save region
-        self.push_undo()
-        existing = self.data[model]['regions']
+        self.current_points = [tuple(p) for p in simplify(sorted_pts, MAX_REGION_VERTICES)]
+        # save region (the mask entry is replaced, not mutated, so undo can keep the old one)
+        entry_before = self.data[model]
+        existing = entry_before['regions']
         next_num = 1
         while f"region-{next_num}" in existing:
             next_num += 1
         region_name = f"region-{next_num}"
-        self.data[model]['regions'] = {region_name: self.current_points.copy()}
-        self.save_json()
+        entry_after = dict(entry_before, regions={region_name: self.current_points.copy()},
+                           resolution=[self.frame_w, self.frame_h])
+        entry_after.pop('normalized', None)
+        entry_after.pop('meta', None)
+        self.data[model] = entry_after
+        self.record_edit([(model, None, entry_before, entry_after)], model)
         # cleanup point markers
         for m in self.point_markers:
             self.canvas.delete(m)
@@ -514,23 +699,29 @@ class RegionCreatorApp:
     def undo(self):
         if not self.undo_stack:
             return
-        import copy
-        self.redo_stack.append((copy.deepcopy(self.data), self.model_var.get()))
-        self.data, model = self.undo_stack.pop()
-        self.model_var.set(model)
-        self.save_json()
-        self.load_model()
-        self._update_undo_redo_buttons()
+        step = self.undo_stack.pop()
+        changes, model_before, _ = step
+        for mask, region, before, _ in reversed(changes):
+            _apply_change(self.data, mask, region, before)
+            self._dirty_masks.add(mask)
+        self.redo_stack.append(step)
+        self._after_history_step(model_before)
 
     def redo(self):
         if not self.redo_stack:
             return
-        import copy
-        self.undo_stack.append((copy.deepcopy(self.data), self.model_var.get()))
-        self.data, model = self.redo_stack.pop()
-        self.model_var.set(model)
-        self.save_json()
-        self.load_model()
+        step = self.redo_stack.pop()
+        changes, _, model_after = step
+        for mask, region, _, after in changes:
+            _apply_change(self.data, mask, region, after)
+            self._dirty_masks.add(mask)
+        self.undo_stack.append(step)
+        self._after_history_step(model_after)
+
+    def _after_history_step(self, model):
+        self.model_menu['values'] = list(self.data.keys())
+        self.model_var.set(model if model in self.data else '')  # write trace reloads the model
+        self.schedule_save()
         self._update_undo_redo_buttons()
 
     def on_motion(self, event):
@@ -552,7 +743,6 @@ class RegionCreatorApp:
         if not model or model not in self.data:
             self.cancel_draw_mode()
             return
-        self.push_undo()
         # Finish region
         x1, y1 = self.start_x, self.start_y
         x2 = min(max(event.x, 0), self.frame_w - 1)
@@ -562,6 +752,15 @@ class RegionCreatorApp:
         top = min(y1, y2)
         bottom = max(y1, y2)
         rect = [(left, top), (right, top), (right, bottom), (left, bottom)]
+        # store in the same coordinate space as the mask's existing regions
+        entry = self.data[model]
+        res = mask_resolution(entry)
+        if res != (self.frame_w, self.frame_h):
+            scaled = scale_points(rect, (self.frame_w, self.frame_h), res)
+            if entry.get('normalized'):
+                rect = [(round(x, 6), round(y, 6)) for x, y in scaled]
+            else:
+                rect = [(int(round(x)), int(round(y))) for x, y in scaled]
 
         # Generate unique region name
         existing = self.data[model]['regions']
@@ -570,7 +769,7 @@ class RegionCreatorApp:
             next_num += 1
         region_name = f"region-{next_num}"
         self.data[model]['regions'][region_name] = rect
-        self.save_json()
+        self.record_edit([(model, region_name, None, rect)], model)
         self.canvas.delete("drawing")
         # Unbind drawing events
         self.canvas.unbind("<ButtonPress-1>")
@@ -582,28 +781,34 @@ class RegionCreatorApp:
         self._update_undo_redo_buttons()
 
     def update_webcam(self):
-        ret, frame = self.cap.read()
-        if ret:
+        if self.capture.error:
+            messagebox.showerror("Error", self.capture.error)
+            return  # keep editing on the last (or blank) background
+        seq, frame = self.capture.latest()
+        if frame is not None and seq != self.bg_seq and not self.freeze_var.get():
+            self.bg_seq = seq
             img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            self.bg_image = ImageTk.PhotoImage(Image.fromarray(img))
-            self.canvas.create_image(0, 0, image=self.bg_image, anchor='nw')
-        self.root.after(33, self.update_webcam)  # ~30 FPS
+            self.bg_image.paste(Image.fromarray(img))
+        self.root.after(BACKGROUND_REFRESH_MS, self.update_webcam)
 
     def on_close(self):
         self.save_json()
         messagebox.showinfo("Saved", f"Region saved to {REGIONS_JSON_PATH}.")
-        self.cap.release()
+        self.capture.stop()
         self.root.destroy()
 
 def main():
+    # optional argument: video source to draw over instead of camera 0
+    source = sys.argv[1] if len(sys.argv) > 1 else VIDEO_SOURCE
     root = tk.Tk()
-    app = RegionCreatorApp(root)
+    app = RegionCreatorApp(root, source=source)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 def save_and_close(self):
     self.save_json()
     messagebox.showinfo("Saved", f"Region saved to {REGIONS_JSON_PATH}.")
+    self.capture.stop()
     self.root.destroy()
 
 # Attach method to class
@@ -0,0 +1,210 @@
+"""Resolution-independent region geometry for regions.json
+
+A mask entry's polygons are stored either in pixels of a tagged
+resolution, or normalized to 0..1:
+
+    {"regions": {...}, "resolution": [1280, 720]}   # pixel coordinates
+    {"regions": {...}, "normalized": true}          # fractions of width/height
+
+Entries with neither key predate tagging and are 1280x720 pixels. Masks are
+rasterized at whatever resolution the pipeline runs at and cached.
+
+    python region_geometry.py normalize regions.json [--out regions_norm.json]
+    python region_geometry.py tag regions.json
+    python region_geometry.py simplify regions.json [--max-vertices 32]
+
+Older files may carry a per-region `meta` map; it is no longer used, and
+every command drops it.
+"""
+import json
+import argparse
+
+import cv2
+import numpy as np
+
+# Canvas size of every regions.json written before resolution tagging
+LEGACY_RESOLUTION = (1280, 720)
+# fillPoly fixed-point bits, so scaled vertices keep sub-pixel precision
+_SHIFT = 4
+
+def mask_resolution(entry):
+    """(width, height) the entry's coordinates are expressed in"""
+    if entry.get('normalized'):
+        return (1.0, 1.0)
+    res = entry.get('resolution')
+    return (res[0], res[1]) if res else LEGACY_RESOLUTION
+
+def scale_points(pts, src_size, dst_size):
+    """Scale an (N, 2) point list from src_size to dst_size as a float array"""
+    a = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    return a * (dst_size[0] / src_size[0], dst_size[1] / src_size[1])
+
+def region_polygons(entry, width, height):
+    """{name: float (N, 2) array} of the entry's regions at width x height"""
+    src = mask_resolution(entry)
+    return {name: scale_points(pts, src, (width, height)) for name, pts in entry.get('regions', {}).items()}
+
+def rasterize(entry, width, height, value=255):
+    """Fill the entry's regions into a uint8 mask of width x height"""
+    m = np.zeros((height, width), dtype=np.uint8)
+    polys = [np.round(p * (1 << _SHIFT)).astype(np.int32) for p in region_polygons(entry, width, height).values()]
+    if polys:
+        cv2.fillPoly(m, polys, value, lineType=cv2.LINE_8, shift=_SHIFT)
+    return m
+
+def to_resolution(entry, width, height):
+    """Copy of `entry` with integer pixel coordinates tagged as width x height"""
+    out = dict(entry)
+    out.pop('normalized', None)
+    out['regions'] = {name: [[int(round(x)), int(round(y))] for x, y in p]
+                      for name, p in region_polygons(entry, width, height).items()}
+    out['resolution'] = [width, height]
+    out.pop('meta', None)
+    return out
+
+def to_normalized(entry, digits=6):
+    """Copy of `entry` with coordinates as fractions of width/height"""
+    out = dict(entry)
+    out.pop('resolution', None)
+    out['regions'] = {name: [[round(x, digits), round(y, digits)] for x, y in p]
+                      for name, p in region_polygons(entry, 1.0, 1.0).items()}
+    out['normalized'] = True
+    out.pop('meta', None)
+    return out
+
+def simplify(pts, max_vertices):
+    """Douglas-Peucker simplify `pts` until it has at most `max_vertices` vertices"""
+    if max_vertices < 3 or len(pts) <= max_vertices:
+        return pts
+    contour = np.asarray(pts, dtype=np.float32).reshape(-1, 1, 2)
+    epsilon = 0.5
+    approx = contour
+    while len(approx) > max_vertices:
+        approx = cv2.approxPolyDP(contour, epsilon, True)
+        epsilon *= 1.5
+    integer = all(isinstance(c, int) for p in pts for c in p)
+    return [[int(round(x)), int(round(y))] if integer else [float(x), float(y)] for x, y in approx.reshape(-1, 2)]
+
+def simplify_regions(entry, max_vertices):
+    """Simplify every region of `entry` in place to at most `max_vertices` vertices"""
+    regions = entry.get('regions', {})
+    for name in list(regions):
+        regions[name] = simplify(regions[name], max_vertices)
+    return entry
+
+class RegionIndex:
+    """Rejects boxes that cannot reach the overlap threshold, from region bounding boxes
+
+    Each region's bbox is taken from its polygon at width x height, rounded
+    outwards, padded by a pixel on every side (rasterizing can set pixels
+    just past the exact outline) and clipped to the frame. The mask pixels
+    in a box are at most its intersections with those bboxes, so
+    `classify()` answers False only when that bound is below the threshold
+    and None (count the mask) otherwise.
+    """
+    def __init__(self, entry, width, height):
+        self.width, self.height = width, height
+        self.boxes = []
+        for poly in region_polygons(entry, width, height).values():
+            if not len(poly):
+                continue
+            x0, y0 = (int(v) - 1 for v in np.floor(poly.min(axis=0)))
+            x1, y1 = (int(v) + 2 for v in np.ceil(poly.max(axis=0)))  # exclusive, +1 pad
+            x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+            if x1 > x0 and y1 > y0:
+                self.boxes.append((x0, y0, x1, y1))
+        self._several = len(self.boxes) > 1
+        if self.boxes:
+            self.union = (min(b[0] for b in self.boxes), min(b[1] for b in self.boxes),
+                          max(b[2] for b in self.boxes), max(b[3] for b in self.boxes))
+            ux0, uy0, ux1, uy1 = self.union
+            self.coverage = (ux1 - ux0) * (uy1 - uy0) / float(width * height)
+        else:
+            self.union = None
+            self.coverage = 0.0
+
+    def classify(self, box, threshold):
+        """False if the box's ROI overlap fraction is certainly below threshold, else None"""
+        x1, y1, x2, y2 = box
+        if x1 < 0 or y1 < 0 or threshold <= 0 or self.union is None:
+            return None  # negative slice starts wrap around in the mask lookup
+        # the mask lookup only sees the part of the box inside the frame
+        if x2 > self.width:
+            x2 = self.width
+        if y2 > self.height:
+            y2 = self.height
+        ux0, uy0, ux1, uy1 = self.union
+        w = (x2 if x2 < ux1 else ux1) - (x1 if x1 > ux0 else ux0)
+        h = (y2 if y2 < uy1 else uy1) - (y1 if y1 > uy0 else uy0)
+        if w <= 0 or h <= 0:
+            return False
+        bound = w * h
+        if self._several:
+            bound = 0
+            for rx0, ry0, rx1, ry1 in self.boxes:
+                w = min(x2, rx1) - max(x1, rx0)
+                h = min(y2, ry1) - max(y1, ry0)
+                if w > 0 and h > 0:
+                    bound += w * h
+        # same division as the mask check, so rounding cannot reject a box it would accept
+        if bound / ((x2 - x1) * (y2 - y1)) < threshold:
+            return False
+        return None
+
+def region_index(entry, width, height, max_coverage=0.5):
+    """RegionIndex for the entry, or None when its regions span too much of the frame to pay off
+
+    A rejection saves one mask-slice count, so the index only wins when many
+    boxes fall clear of the regions; for ROIs covering most of the frame the
+    plain mask lookup is faster.
+    """
+    index = RegionIndex(entry, width, height)
+    return index if index.coverage <= max_coverage else None
+
+class MaskCache:
+    """ROI masks rasterized on first use per (mask model, width, height)"""
+    def __init__(self, data, build=None):
+        self.data = data
+        self.build = build or rasterize
+        self._masks = {}
+
+    def get(self, model, width, height):
+        key = (model, width, height)
+        if key not in self._masks:  # the builder may return None (e.g. no useful index)
+            self._masks[key] = self.build(self.data.get(model, {}), width, height)
+        return self._masks[key]
+
+    def invalidate(self, model=None):
+        if model is None:
+            self._masks.clear()
+        else:
+            for key in [k for k in self._masks if k[0] == model]:
+                del self._masks[key]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert regions.json geometry")
+    parser.add_argument('command', choices=['normalize', 'tag', 'simplify'],
+                        help='normalize: store 0..1 coordinates; tag: add the resolution to untagged masks; '
+                             'simplify: reduce every region to at most --max-vertices vertices')
+    parser.add_argument('path', help='regions.json')
+    parser.add_argument('--out', default=None, help='output file (default: overwrite input)')
+    parser.add_argument('--max-vertices', type=int, default=32,
+                        help='simplify: vertex limit per region')
+    args = parser.parse_args(argv)
+    with open(args.path, 'r') as f:
+        data = json.load(f)
+    for model, entry in data.items():
+        entry.pop('meta', None)
+        if args.command == 'normalize':
+            data[model] = to_normalized(entry)
+        elif args.command == 'simplify':
+            simplify_regions(entry, args.max_vertices)
+        elif not entry.get('normalized') and 'resolution' not in entry:
+            entry['resolution'] = list(LEGACY_RESOLUTION)
+    with open(args.out or args.path, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"[Regions] {args.command}: {len(data)} masks written to {args.out or args.path}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""CPU resource governor: thread pools and core affinity
+
+Applies the `resources` section of gui_config.json at startup:
+
+    "resources": {
+      "inference_threads": 2,     # torch intra-op threads (0 = library default)
+      "interop_threads": 1,       # torch inter-op threads (0 = library default)
+      "opencv_threads": 1,        # cv2.setNumThreads (-1 = library default, 0 = no threading)
+      "affinity": {"capture": [0], "inference": [1, 2], "recording": [3]}
+    }
+
+Affinity lists are CPU indices for the thread that runs each stage (Linux
+only; empty means unpinned). Threads started by a pinned thread inherit its
+cores, so the inference cores are applied before the model is loaded.
+`capture` applies to the decode-ahead thread of video file and image
+directory sources only: cameras and streams are read on the Tk thread,
+which runs with the `inference` cores.
+
+The sweep benchmarks process_frame on this machine across thread settings
+and recommends the one with the lowest p95 frame time:
+
+    python resource_governor.py sweep
+    python resource_governor.py sweep --frames 200 --affinity 1,2 --json sweep.json --save
+"""
+import os
+import copy
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+STAGES = ('capture', 'inference', 'recording')
+DEFAULT_RESOURCES = {
+    'inference_threads': 0,
+    'interop_threads': 0,
+    'opencv_threads': -1,
+    'affinity': {stage: [] for stage in STAGES},
+}
+
+def resource_settings(cfg=None):
+    """DEFAULT_RESOURCES overlaid with a (possibly partial) `resources` config section"""
+    out = copy.deepcopy(DEFAULT_RESOURCES)
+    for key, value in (cfg or {}).items():
+        if key == 'affinity':
+            out['affinity'].update(value or {})
+        else:
+            out[key] = value
+    return out
+
+def pin_thread(resources, stage):
+    """Pin the calling thread to the cores configured for `stage`; True if pinned"""
+    cores = resources.get('affinity', {}).get(stage)
+    if not cores:
+        return False
+    if not hasattr(os, 'sched_setaffinity'):
+        print(f"[Warning] CPU affinity is not supported on this platform; '{stage}' left unpinned")
+        return False
+    try:
+        os.sched_setaffinity(0, cores)  # 0 is the calling thread on Linux
+        return True
+    except Exception as e:
+        print(f"[Warning] Failed to pin {stage} to CPUs {cores}: {e}")
+        return False
+
+def set_inference_threads(threads, interop=0):
+    """Set torch's intra-op (and, before first use, inter-op) thread counts"""
+    try:
+        import torch
+    except ImportError:
+        return False
+    try:
+        if threads:
+            torch.set_num_threads(int(threads))
+        if interop:
+            torch.set_num_interop_threads(int(interop))
+        return True
+    except Exception as e:
+        print(f"[Warning] Failed to set inference threads: {e}")
+        return False
+
+def apply_resources(resources):
+    """Apply thread counts and pin the calling (inference) thread; call before loading the model"""
+    if resources['opencv_threads'] >= 0:
+        cv2.setNumThreads(int(resources['opencv_threads']))
+    pinned = pin_thread(resources, 'inference')
+    set_inference_threads(resources['inference_threads'], resources['interop_threads'])
+    print(f"[Resources] inference threads {resources['inference_threads'] or 'default'}, "
+          f"OpenCV threads {cv2.getNumThreads()}, "
+          f"inference CPUs {resources['affinity']['inference'] if pinned else 'any'}")
+
+def _cpu_count():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _candidates(cores):
+    counts = sorted({1, 2, max(1, cores // 2), cores})
+    return [(t, c) for t in counts if t <= cores for c in sorted({0, 2, cores}) if c <= cores]
+
+def sweep(args):
+    """Time process_frame for each (inference threads, OpenCV threads) pair"""
+    import yolo11n_arduino as detector
+    from latency_harness import SyntheticFrameSource, StubModel
+
+    if args.affinity:
+        args.pinned = pin_thread({'affinity': {'sweep': [int(c) for c in args.affinity.split(',')]}}, 'sweep')
+    cores = _cpu_count()
+    with open(args.regions, 'r') as f:
+        data = json.load(f)
+    mask_name = args.mask or next(iter(data))
+    width, height = args.width, args.height
+    mask = detector.build_mask(data[mask_name], width, height)
+    index = detector.region_index(data[mask_name], width, height)
+    if args.stub_ms is not None:
+        model = StubModel(latency=args.stub_ms / 1000.0)
+    else:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+    source = SyntheticFrameSource(width, height, fps=0, background=args.background, seed=args.seed)
+    annotated = np.empty((height, width, 3), dtype=np.uint8)
+    infer_w, infer_h = detector.infer_size(width, height)
+    small = np.empty((infer_h, infer_w, 3), dtype=np.uint8)
+
+    results = []
+    try:
+        for threads, cv_threads in _candidates(cores):
+            set_inference_threads(threads)
+            cv2.setNumThreads(cv_threads)
+            times = []
+            for i in range(args.warmup + args.frames):
+                frame, _ = source.read()
+                t0 = time.perf_counter()
+                detector.process_frame(frame, mask, model, out=annotated, small=small, index=index)
+                if i >= args.warmup:
+                    times.append(time.perf_counter() - t0)
+            a = np.asarray(times) * 1e3
+            r = {'inference_threads': threads, 'opencv_threads': cv_threads,
+                 'p50_ms': float(np.percentile(a, 50)), 'p95_ms': float(np.percentile(a, 95)),
+                 'p99_ms': float(np.percentile(a, 99)), 'mean_ms': float(a.mean())}
+            results.append(r)
+            print(f"[Sweep] torch {threads:2d} / OpenCV {cv_threads:2d} threads: "
+                  f"p50 {r['p50_ms']:6.1f} ms, p95 {r['p95_ms']:6.1f} ms, p99 {r['p99_ms']:6.1f} ms")
+    finally:
+        source.release()
+    # lowest tail latency wins; fewer threads break ties (within 2%) to leave cores free
+    fastest = min(r['p95_ms'] for r in results)
+    best = min((r for r in results if r['p95_ms'] <= fastest * 1.02),
+               key=lambda r: (r['inference_threads'] + r['opencv_threads'], r['p95_ms']))
+    return {'cpus': cores, 'frames': args.frames, 'resolution': [width, height],
+            'model': args.model if args.stub_ms is None else f'stub ({args.stub_ms} ms)',
+            'results': results, 'recommended': best}
+
+def main(argv=None):
+    import yolo11n_arduino as detector
+    config = detector.config
+    parser = argparse.ArgumentParser(description="Tune inference/OpenCV thread counts for this machine")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('sweep', help='benchmark process_frame across thread settings')
+    p.add_argument('--model', default=config.model_path, help='YOLO weights')
+    p.add_argument('--stub-ms', type=float, default=None, help='use the stub model with this delay instead of YOLO')
+    p.add_argument('--regions', default=config.region_json_path)
+    p.add_argument('--mask', default=None, help='mask model name (default: first in file)')
+    p.add_argument('--background', default=None, help='recorded video to use as frames')
+    p.add_argument('--width', type=int, default=config.capture_width)
+    p.add_argument('--height', type=int, default=config.capture_height)
+    p.add_argument('--frames', type=int, default=100, help='timed frames per setting')
+    p.add_argument('--warmup', type=int, default=10, help='untimed frames per setting')
+    p.add_argument('--affinity', default=None, help='comma-separated CPUs to run the sweep on, e.g. 1,2')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--json', default=None, help='write all results to this file')
+    p.add_argument('--save', action='store_true', help='store the recommendation in gui_config.json')
+    args = parser.parse_args(argv)
+    args.pinned = False
+
+    report = sweep(args)
+    best = report['recommended']
+    print(f"[Sweep] Recommended: inference_threads {best['inference_threads']}, "
+          f"opencv_threads {best['opencv_threads']} (p95 {best['p95_ms']:.1f} ms on {report['cpus']} CPUs)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[Sweep] Report saved: {args.json}")
+    if args.save:
+        config.resources['inference_threads'] = best['inference_threads']
+        config.resources['opencv_threads'] = best['opencv_threads']
+        if args.affinity and args.pinned:
+            config.resources['affinity']['inference'] = [int(c) for c in args.affinity.split(',')]
+        config.save()
+        print(f"[Sweep] Saved to {config.config_file}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,150 @@
+"""On-demand sampling profiler for the running detector
+
+While a profile runs, a daemon thread reads every thread's Python stack
+(`sys._current_frames()`) each `interval` seconds; nothing is installed
+with sys.setprofile/settrace, and when no profile runs no thread exists,
+so the app pays nothing. Threads are told apart by name (MainThread runs
+Tk, capture and inline inference; `source-decode`, `recorder`,
+`monitor-*` and any inference worker show up as their own roots).
+
+Each profile writes two files to `out_dir`:
+
+    profile_<time>.folded   collapsed stacks, one "thread;outer;...;inner count" per line
+                            (flamegraph.pl, speedscope, inferno)
+    profile_<time>.txt      per-function self/total sample share
+
+The detector starts one from F9, SIGUSR1 (picked up on the next frame)
+or, with `monitor_allow_profile`, `GET /profile?seconds=N` on the monitor
+server. A folded file can be summarized again later:
+
+    python sampling_profiler.py profiles/profile_20261018_101500.folded --top 30
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import threading
+from collections import Counter
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def summarize(stacks, top=40):
+    """Per-function table from {folded stack: count}, sorted by self samples"""
+    total = sum(stacks.values()) or 1
+    own, inclusive = Counter(), Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += n
+        for f in set(frames[1:]):  # frame 0 is the thread name
+            inclusive[f] += n
+    lines = [f"{total} samples", f"{'self %':>7} {'total %':>8}  function"]
+    for f, n in own.most_common(top):
+        lines.append(f"{100 * n / total:7.1f} {100 * inclusive[f] / total:8.1f}  {f}")
+    return '\n'.join(lines) + '\n'
+
+def read_folded(path):
+    stacks = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, n = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(n)
+    return stacks
+
+class SamplingProfiler:
+    """Samples all thread stacks for a while, then writes folded stacks and a summary"""
+    def __init__(self, out_dir='profiles', interval=0.005, max_depth=64):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.max_depth = max_depth
+        self.last_result = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, seconds=10.0):
+        """Start a profile of `seconds`; returns False if one is already running"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._stop.clear()
+            self.last_result = None
+            self._thread = threading.Thread(target=self._run, args=(seconds,), name='profiler', daemon=True)
+            self._thread.start()
+        print(f"[Profile] Sampling all threads for {seconds:g} s")
+        return True
+
+    def stop(self):
+        """End the running profile early (its files are still written)"""
+        self._stop.set()
+
+    def toggle(self, seconds=10.0):
+        if self.running:
+            self.stop()
+        else:
+            self.start(seconds)
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.last_result
+
+    def _run(self, seconds):
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        end = time.monotonic() + seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < end:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    labels = []
+                    while frame is not None and len(labels) < self.max_depth:
+                        labels.append(_label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f'thread-{ident}'))
+                    stacks[';'.join(reversed(labels))] += 1
+                samples += 1
+                self._stop.wait(self.interval)
+            self.last_result = self._write(stacks, samples)
+        except Exception as e:
+            print(f"[Warning] Profile failed: {e}")
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def _write(self, stacks, samples):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"profile_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for stack, n in sorted(stacks.items()):
+                f.write(f"{stack} {n}\n")
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(f"{samples} sampling rounds at {self.interval * 1000:g} ms\n")
+            f.write(summarize(stacks))
+        print(f"[Profile] Saved {base}.folded and {base}.txt ({samples} rounds)")
+        return {'folded': base + '.folded', 'summary': base + '.txt', 'samples': samples}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a collapsed-stack profile per function")
+    parser.add_argument('folded', help='profile_<time>.folded written by the detector')
+    parser.add_argument('--thread', default=None, help='only stacks of this thread (e.g. MainThread)')
+    parser.add_argument('--top', type=int, default=40)
+    args = parser.parse_args(argv)
+    stacks = read_folded(args.folded)
+    if args.thread:
+        stacks = Counter({s: n for s, n in stacks.items() if s.split(';', 1)[0] == args.thread})
+    print(summarize(stacks, args.top), end='')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+"""Offline threshold sweep over recorded footage
+
+Step 1 runs YOLO once per video at a low confidence floor and caches every
+raw box (capture pixels), its confidence and frame number in a .npz file:
+
+    python threshold_sweep.py cache recordings/*.mp4 --conf-floor 0.05
+
+Step 2 re-evaluates the ROI check and the stop/resume logic for a grid of
+confidence, overlap, mask and debounce settings from the caches alone. Box
+overlap with each mask comes from an integral image, so every box is scored
+with four lookups, and each setting is evaluated with array operations:
+
+    python threshold_sweep.py sweep cache/ --conf 0.3 0.45 0.6 --overlap 0.05 0.1 0.2 \\
+        --debounce-on 1 2 3 --debounce-off 1 5 15 --json sweep.json
+
+The stop logic mirrors the GUI with auto-resume: the motor stops once a
+detection has lasted `debounce_on` consecutive frames and resumes after
+`debounce_off` consecutive clear frames (1/1 is the current behaviour).
+Videos are processed in parallel with --workers.
+"""
+import os
+import glob
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from region_geometry import rasterize
+
+CACHE_SUFFIX = '.boxes.npz'
+
+def cache_path(video, cache_dir):
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(video))[0] + CACHE_SUFFIX)
+
+def cache_video(video, model_path, cache_dir, conf_floor=0.05, force=False):
+    """Run the model over every frame of `video` and save all boxes above `conf_floor`"""
+    out = cache_path(video, cache_dir)
+    if not force and os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(video):
+        return out, None
+    from ultralytics import YOLO
+    from yolo11n_arduino import infer_size
+    model = YOLO(model_path)
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    boxes, confs, frames = [], [], []
+    small = None
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        h, w = frame.shape[:2]
+        iw, ih = infer_size(w, h)
+        small = frame if (iw, ih) == (w, h) else cv2.resize(frame, (iw, ih), dst=small)
+        for r in model(small, conf=conf_floor, verbose=False):
+            if len(r.boxes):
+                xyxy = r.boxes.xyxy.cpu().numpy() * (w / iw, h / ih, w / iw, h / ih)
+                boxes.append(xyxy.astype(np.float32))
+                confs.append(r.boxes.conf.cpu().numpy().astype(np.float32))
+                frames.append(np.full(len(xyxy), n, dtype=np.int32))
+        n += 1
+    cap.release()
+    np.savez_compressed(out,
+                        boxes=np.concatenate(boxes) if boxes else np.empty((0, 4), np.float32),
+                        conf=np.concatenate(confs) if confs else np.empty(0, np.float32),
+                        frame=np.concatenate(frames) if frames else np.empty(0, np.int32),
+                        n_frames=n, fps=fps, frame_size=(w, h) if n else (0, 0),
+                        conf_floor=conf_floor, video=os.path.abspath(video))
+    return out, (n, time.perf_counter() - t0)
+
+def box_overlap(boxes, mask):
+    """Fraction of each box's pixels inside `mask`, as check_box_in_roi computes it"""
+    h, w = mask.shape
+    ii = cv2.integral((mask > 0).astype(np.uint8))  # (h+1, w+1) running sums
+    b = boxes.astype(np.int64)  # int() truncation, like process_frame
+    x1, y1 = np.clip(b[:, 0], 0, w), np.clip(b[:, 1], 0, h)
+    x2, y2 = np.clip(b[:, 2], 0, w), np.clip(b[:, 3], 0, h)
+    area = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    inside = ii[y2, x2] - ii[y1, x2] - ii[y2, x1] + ii[y1, x1]
+    return np.where(area > 0, inside / np.maximum(area, 1), 0.0)
+
+def _runs(detected):
+    """(starts, lengths, values) of the runs in a boolean array"""
+    change = np.flatnonzero(np.diff(detected.astype(np.int8))) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [len(detected)])))
+    return starts, lengths, detected[starts]
+
+def stop_events(detected, debounce_on=1, debounce_off=1):
+    """Frame numbers of stops and resumes under debounced auto-resume
+
+    Only detection runs of at least `debounce_on` frames can stop the motor
+    and only clear runs of at least `debounce_off` frames can resume it, so
+    the state changes exactly at the first long run of the other kind.
+    """
+    if not len(detected):
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    starts, lengths, values = _runs(detected)
+    long_ = np.where(values, lengths >= debounce_on, lengths >= debounce_off)
+    s, v = starts[long_], values[long_]
+    prev = np.concatenate(([False], v[:-1]))  # motor starts running
+    toggles = v != prev
+    stops = s[toggles & v] + debounce_on - 1
+    resumes = s[toggles & ~v] + debounce_off - 1
+    return stops, resumes
+
+def evaluate(cache_file, entries, conf_grid, overlap_grid, on_grid, off_grid, short_stop_s=2.0):
+    """Stop statistics for every (mask, conf, overlap, debounce_on, debounce_off) on one cached video"""
+    # NpzFile decompresses an array on every access: read each one once
+    with np.load(cache_file) as c:
+        n, fps = int(c['n_frames']), float(c['fps'])
+        w, h = (int(v) for v in c['frame_size'])
+        boxes, confs, frames = c['boxes'], c['conf'], c['frame']
+    results = []
+    if n == 0:
+        return os.path.basename(cache_file), 0.0, results
+    for name, entry in entries.items():
+        frac = box_overlap(boxes, rasterize(entry, w, h))
+        for conf, overlap in itertools.product(conf_grid, overlap_grid):
+            hit = (confs >= conf) & (frac >= overlap)
+            detected = np.zeros(n, dtype=bool)
+            detected[frames[hit]] = True
+            for on, off in itertools.product(on_grid, off_grid):
+                stops, resumes = stop_events(detected, on, off)
+                k = min(len(stops), len(resumes))
+                dwell = (resumes[:k] - stops[:k]) / fps
+                stopped = dwell.sum() + ((n - stops[k]) / fps if len(stops) > k else 0.0)
+                results.append({'mask': name, 'conf': conf, 'overlap': overlap,
+                                'debounce_on': on, 'debounce_off': off,
+                                'stops': int(len(stops)), 'resumes': int(k),
+                                'short_stops': int((dwell < short_stop_s).sum()),
+                                'dwell_s': float(dwell.sum()), 'stopped_s': float(stopped),
+                                'detected_frames': int(detected.sum())})
+    return os.path.basename(cache_file), n / fps if fps else 0.0, results
+
+def sweep(args):
+    caches = []
+    for path in args.caches:
+        caches.extend(sorted(glob.glob(os.path.join(path, '*' + CACHE_SUFFIX))) if os.path.isdir(path) else [path])
+    if not caches:
+        raise RuntimeError("No box caches found; run the cache step first")
+    with open(args.regions, 'r') as f:
+        data = json.load(f)
+    entries = {name: data[name] for name in (args.mask or data)}
+    grid = (args.conf, args.overlap, args.debounce_on, args.debounce_off)
+    t0 = time.perf_counter()
+    jobs = [(path, entries) + grid + (args.short_stop_s,) for path in caches]
+    if args.workers > 1 and len(caches) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            per_video = list(pool.map(evaluate, *zip(*jobs)))
+    else:
+        per_video = [evaluate(*job) for job in jobs]
+
+    # sum each setting over all videos
+    totals = {}
+    duration = 0.0
+    for _, seconds, results in per_video:
+        duration += seconds
+        for r in results:
+            key = (r['mask'], r['conf'], r['overlap'], r['debounce_on'], r['debounce_off'])
+            t = totals.setdefault(key, dict(r, stops=0, resumes=0, short_stops=0, dwell_s=0.0, stopped_s=0.0,
+                                            detected_frames=0))
+            for field in ('stops', 'resumes', 'short_stops', 'dwell_s', 'stopped_s', 'detected_frames'):
+                t[field] += r[field]
+    settings = list(totals.values())
+    for s in settings:
+        s['stops_per_hour'] = s['stops'] / duration * 3600 if duration else 0.0
+        s['mean_dwell_s'] = s['dwell_s'] / s['resumes'] if s['resumes'] else None
+        s['stopped_fraction'] = s['stopped_s'] / duration if duration else 0.0
+    return {'videos': [v for v, _, _ in per_video], 'duration_s': duration, 'settings': settings,
+            'elapsed_s': time.perf_counter() - t0}
+
+def main(argv=None):
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Cache detections once, then sweep thresholds offline")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('cache', help='run the model over videos and cache raw boxes')
+    p.add_argument('videos', nargs='+')
+    p.add_argument('--model', default=os.path.join(root, 'weights', 'YOLO11n.pt'))
+    p.add_argument('--cache-dir', default=os.path.join(root, 'cache'))
+    p.add_argument('--conf-floor', type=float, default=0.05, help='lowest confidence kept in the cache')
+    p.add_argument('--workers', type=int, default=1, help='videos processed in parallel (each loads the model)')
+    p.add_argument('--force', action='store_true', help='rebuild caches that are up to date')
+    p = sub.add_parser('sweep', help='re-evaluate stop logic over a threshold grid')
+    p.add_argument('caches', nargs='+', help='cache directory or .boxes.npz files')
+    p.add_argument('--regions', default=os.path.join(root, 'regions.json'))
+    p.add_argument('--mask', action='append', help='mask to evaluate (repeatable; default: all)')
+    p.add_argument('--conf', type=float, nargs='+', default=[0.25, 0.35, 0.45, 0.55, 0.65])
+    p.add_argument('--overlap', type=float, nargs='+', default=[0.05, 0.1, 0.2, 0.3])
+    p.add_argument('--debounce-on', type=int, nargs='+', default=[1, 2, 3], help='detected frames before stopping')
+    p.add_argument('--debounce-off', type=int, nargs='+', default=[1, 5, 15], help='clear frames before resuming')
+    p.add_argument('--short-stop-s', type=float, default=2.0, help='stops resumed within this time are counted as short')
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--top', type=int, default=20, help='settings to print')
+    p.add_argument('--json', default=None, help='write every setting to this file')
+    args = parser.parse_args(argv)
+
+    if args.command == 'cache':
+        os.makedirs(args.cache_dir, exist_ok=True)
+        jobs = [(v, args.model, args.cache_dir, args.conf_floor, args.force) for v in args.videos]
+        if args.workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                done = list(pool.map(cache_video, *zip(*jobs)))
+        else:
+            done = [cache_video(*job) for job in jobs]
+        for path, stats in done:
+            if stats is None:
+                print(f"[Sweep] Up to date: {path}")
+            else:
+                print(f"[Sweep] Cached {stats[0]} frames in {stats[1]:.1f}s: {path}")
+        return 0
+
+    report = sweep(args)
+    settings = sorted(report['settings'], key=lambda s: (s['short_stops'], s['stops']))
+    print(f"[Sweep] {len(settings)} settings over {len(report['videos'])} videos "
+          f"({report['duration_s'] / 60:.1f} min of footage) in {report['elapsed_s']:.2f}s")
+    print(f"[Sweep] {'mask':<12} {'conf':>5} {'ovl':>5} {'on':>3} {'off':>4} {'stops':>6} {'short':>6} "
+          f"{'/hour':>7} {'dwell':>7} {'stopped':>8}")
+    for s in settings[:args.top]:
+        dwell = f"{s['mean_dwell_s']:6.1f}s" if s['mean_dwell_s'] is not None else '      -'
+        print(f"[Sweep] {s['mask'][:12]:<12} {s['conf']:5.2f} {s['overlap']:5.2f} {s['debounce_on']:3d} "
+              f"{s['debounce_off']:4d} {s['stops']:6d} {s['short_stops']:6d} {s['stops_per_hour']:7.1f} "
+              f"{dwell} {s['stopped_fraction']:7.1%}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[Sweep] Report saved: {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -9,10 +9,20 @@ import time
 import serial
 from ultralytics import YOLO
 import json
+import signal
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
 import sv_ttk
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
+from perf_metrics import PipelineMetrics
+from frame_scheduler import FrameScheduler
+from event_journal import EventJournal
+from region_geometry import rasterize, MaskCache, RegionIndex, region_index
+from resource_governor import resource_settings, apply_resources
+from recorder import Recorder, FOURCC_EXTENSIONS
+from monitor_server import MonitorServer
+from frame_source import open_source
+from sampling_profiler import SamplingProfiler
 
 class Config:
     def __init__(self):
@@ -38,6 +48,36 @@ class Config:
         self.recordings_dir = cfg.get('recordings_dir', os.path.join(os.path.dirname(__file__), 'recordings'))
         self.screenshots_dir = cfg.get('screenshots_dir', os.path.join(os.path.dirname(__file__), 'screenshots'))
         self.auto_screenshot = cfg.get('auto_screenshot', True)
+        self.metrics_overlay = cfg.get('metrics_overlay', False)
+        self.metrics_dir = cfg.get('metrics_dir', os.path.join(os.path.dirname(__file__), 'metrics'))
+        self.metrics_export_interval = cfg.get('metrics_export_interval', 10.0)  # seconds, 0 disables
+        self.target_fps = cfg.get('target_fps', 30.0)  # detection loop rate
+        self.display_fps = cfg.get('display_fps', 15.0)  # preview repaint rate (<= target_fps)
+        self.journal_enabled = cfg.get('journal_enabled', True)
+        self.journal_dir = cfg.get('journal_dir', os.path.join(os.path.dirname(__file__), 'journal'))
+        self.journal_max_mb = cfg.get('journal_max_mb', 50)  # rotate journal files at this size
+        self.journal_max_files = cfg.get('journal_max_files', 20)  # delete the oldest beyond this many, 0 keeps all
+        self.journal_frame_every = cfg.get('journal_frame_every', 30)  # per-frame summary every N frames, 0 disables
+        self.video_source = cfg.get('video_source', 0)  # camera index/device, video file, image directory or stream URL
+        self.video_loop = cfg.get('video_loop', False)  # restart file/image sources at the end
+        self.capture_width = cfg.get('capture_width', 1280)  # requested; the camera's actual mode is used
+        self.capture_height = cfg.get('capture_height', 720)
+        self.camera_mode = cfg.get('camera_mode', {})  # fourcc/width/height/fps/buffer_size chosen by camera_probe.py
+        self.resources = resource_settings(cfg.get('resources'))  # thread counts and per-stage CPU affinity (capture: file/image sources only; cameras use inference)
+        self.recording_mode = cfg.get('recording_mode', 'annotated')  # 'annotated' (as displayed) or 'raw' + sidecar
+        self.recording_scale = cfg.get('recording_scale', 1.0)  # downscale factor for recorded video
+        self.recording_fourcc = cfg.get('recording_fourcc', 'mp4v')  # e.g. 'MJPG' (.avi) encodes faster
+        self.recording_keyframe_interval = cfg.get('recording_keyframe_interval', 12)  # frames between keyframes
+        self.monitor_enabled = cfg.get('monitor_enabled', False)  # HTTP MJPEG stream + JSON status
+        self.monitor_host = cfg.get('monitor_host', '0.0.0.0')
+        self.monitor_port = cfg.get('monitor_port', 8080)
+        self.monitor_fps = cfg.get('monitor_fps', 5.0)
+        self.monitor_width = cfg.get('monitor_width', 640)
+        self.monitor_quality = cfg.get('monitor_quality', 70)
+        self.monitor_allow_profile = cfg.get('monitor_allow_profile', False)  # serve /profile (unauthenticated)
+        self.profiles_dir = cfg.get('profiles_dir', os.path.join(os.path.dirname(__file__), 'profiles'))
+        self.profile_seconds = cfg.get('profile_seconds', 10.0)  # F9 / SIGUSR1 profile length
+        self.profile_interval_ms = cfg.get('profile_interval_ms', 5.0)  # stack sampling period
         
         # Create recordings directory if it doesn't exist
         if not os.path.exists(self.recordings_dir):
@@ -67,7 +107,37 @@ class Config:
             'motor_speed': self.motor_speed,
             'recordings_dir': self.recordings_dir,
             'screenshots_dir': self.screenshots_dir,
-            'auto_screenshot': self.auto_screenshot
+            'auto_screenshot': self.auto_screenshot,
+            'metrics_overlay': self.metrics_overlay,
+            'metrics_dir': self.metrics_dir,
+            'metrics_export_interval': self.metrics_export_interval,
+            'target_fps': self.target_fps,
+            'display_fps': self.display_fps,
+            'journal_enabled': self.journal_enabled,
+            'journal_dir': self.journal_dir,
+            'journal_max_mb': self.journal_max_mb,
+            'journal_max_files': self.journal_max_files,
+            'journal_frame_every': self.journal_frame_every,
+            'video_source': self.video_source,
+            'video_loop': self.video_loop,
+            'capture_width': self.capture_width,
+            'capture_height': self.capture_height,
+            'camera_mode': self.camera_mode,
+            'resources': self.resources,
+            'recording_mode': self.recording_mode,
+            'recording_scale': self.recording_scale,
+            'recording_fourcc': self.recording_fourcc,
+            'recording_keyframe_interval': self.recording_keyframe_interval,
+            'monitor_enabled': self.monitor_enabled,
+            'monitor_host': self.monitor_host,
+            'monitor_port': self.monitor_port,
+            'monitor_fps': self.monitor_fps,
+            'monitor_width': self.monitor_width,
+            'monitor_quality': self.monitor_quality,
+            'monitor_allow_profile': self.monitor_allow_profile,
+            'profiles_dir': self.profiles_dir,
+            'profile_seconds': self.profile_seconds,
+            'profile_interval_ms': self.profile_interval_ms
         }
         try:
             with open(self.config_file, 'w') as f:
@@ -78,17 +148,52 @@ class Config:
 # Initialize configuration
 config = Config()
 
-# Initialize Serial Communication with Arduino
-try:
-    arduino = serial.Serial(port=config.serial_port, baudrate=config.baud_rate, timeout=1)
-    time.sleep(2)  # Wait for Arduino to initialize
-    print("Arduino connected successfully!")
-except Exception as e:
-    print(f"Error connecting to Arduino: {e}")
-    arduino = None
-
-def check_box_in_roi(box_coords, mask):
-    """Check if the detected bounding box is within the Region of Interest (ROI)"""
+def connect_arduino(port=None, baud_rate=None):
+    """Open the Arduino serial port, or return None if it is unavailable"""
+    try:
+        arduino = serial.Serial(port=port or config.serial_port, baudrate=baud_rate or config.baud_rate, timeout=1)
+        time.sleep(2)  # Wait for Arduino to initialize
+        print("Arduino connected successfully!")
+        return arduino
+    except Exception as e:
+        print(f"Error connecting to Arduino: {e}")
+        return None
+
+def send_command(arduino, sig, speed):
+    """Write a `sig:speed` command (e.g. "1:200") to the Arduino and return it"""
+    command = f"{sig}:{speed}\n"
+    arduino.write(command.encode())
+    return command
+
+def read_serial_lines(arduino, pending=b''):
+    """Return (complete lines, leftover bytes) waiting on the serial port, without blocking"""
+    n = arduino.in_waiting
+    if not n:
+        return [], pending
+    pending += arduino.read(n)
+    *lines, pending = pending.split(b'\n')
+    return [line.decode(errors='replace').strip() for line in lines], pending
+
+def build_mask(entry, width, height):
+    """Rasterize a regions.json mask entry into a binary ROI mask of width x height
+
+    The polygons are scaled from the resolution they were drawn at, so the
+    mask matches the frames whatever mode the camera delivers.
+    """
+    m = rasterize(entry, width, height, config.mask_max_value)
+    _, m = cv2.threshold(m, config.mask_threshold, config.mask_max_value, cv2.THRESH_BINARY)
+    return m
+
+def check_box_in_roi(box_coords, mask, index=None):
+    """Check if the detected bounding box is within the Region of Interest (ROI)
+
+    With a RegionIndex, boxes that cannot reach the overlap threshold from
+    the region bboxes alone are rejected without counting mask pixels.
+    """
+    if index is not None:
+        decided = index.classify(box_coords, config.overlap_threshold)
+        if decided is not None:
+            return decided
     x1, y1, x2, y2 = box_coords
     box_region = mask[y1:y2, x1:x2]
     
@@ -98,18 +203,56 @@ def check_box_in_roi(box_coords, mask):
     overlap_percentage = np.count_nonzero(box_region) / box_region.size
     return overlap_percentage >= config.overlap_threshold
 
-# inference resolution (smaller for speed)
+# inference resolution (smaller for speed); the height follows the frame's aspect ratio
 INFER_WIDTH, INFER_HEIGHT = 640, 360
 
-def process_frame(frame, mask, model):
-    """Process a single webcam frame with YOLO"""
+def infer_size(width, height):
+    """(width, height) of the inference input for frames of width x height"""
+    if width <= INFER_WIDTH:
+        return width, height
+    return INFER_WIDTH, max(2, int(round(INFER_WIDTH * height / width / 2)) * 2)
+
+# preview canvas size; frames are scaled to fit it only for painting
+DISPLAY_WIDTH, DISPLAY_HEIGHT = 1280, 720
+
+def display_size(width, height):
+    """(width, height) of a width x height frame fitted into the preview canvas"""
+    scale = min(DISPLAY_WIDTH / width, DISPLAY_HEIGHT / height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+def process_frame(frame, mask, model, out=None, small=None, metrics=None, detections=None, index=None):
+    """Process a single webcam frame with YOLO
+
+    `out` and `small` are optional preallocated buffers for the annotated frame
+    and the downscaled inference input; when given no new arrays are created
+    and `small` sets the inference size (default: infer_size() of the frame).
+    `metrics` (a PipelineMetrics) receives resize/inference/roi timings.
+    `detections`, if a list, gets one (x1, y1, x2, y2, conf, in_roi) per box.
+    `index` is the mask's RegionIndex for the fast ROI pre-check (None to always count mask pixels).
+    """
+    t = time.perf_counter()
     # downscale for faster inference
     orig_h, orig_w = frame.shape[:2]
-    small = cv2.resize(frame, (INFER_WIDTH, INFER_HEIGHT))
-    scale_x = orig_w / INFER_WIDTH
-    scale_y = orig_h / INFER_HEIGHT
+    if small is None:
+        infer_w, infer_h = infer_size(orig_w, orig_h)
+    else:
+        infer_h, infer_w = small.shape[:2]
+    if (infer_w, infer_h) != (orig_w, orig_h):
+        small = cv2.resize(frame, (infer_w, infer_h), dst=small)
+    else:
+        small = frame  # already small enough, infer on the frame itself
+    scale_x = orig_w / infer_w
+    scale_y = orig_h / infer_h
+    if metrics is not None:
+        t = metrics.lap('resize', t)
     results = model(small, conf=config.conf_threshold, verbose=False)
-    annotated_frame = frame.copy()
+    if metrics is not None:
+        t = metrics.lap('inference', t)
+    if out is None:
+        annotated_frame = frame.copy()
+    else:
+        np.copyto(out, frame)
+        annotated_frame = out
     object_detected = False
     
     for r in results:
@@ -118,7 +261,14 @@ def process_frame(frame, mask, model):
             x1, y1, x2, y2 = (int(x1_s * scale_x), int(y1_s * scale_y), int(x2_s * scale_x), int(y2_s * scale_y))
             conf = float(box.conf[0])
 
-            if check_box_in_roi((x1, y1, x2, y2), mask):
+            if metrics is not None:
+                t = time.perf_counter()
+            in_roi = check_box_in_roi((x1, y1, x2, y2), mask, index)
+            if metrics is not None:
+                metrics.lap('roi', t)
+            if detections is not None:
+                detections.append((x1, y1, x2, y2, conf, in_roi))
+            if in_roi:
                 object_detected = True
                 cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 4)
                 conf_text = f'Conf: {conf:.2f}'
@@ -128,8 +278,85 @@ def process_frame(frame, mask, model):
     # return annotated frame and detection flag; signaling moved to GUI loop
     return annotated_frame, object_detected
 
+class FrameRenderer:
+    """Preallocated buffers for the resize -> overlay -> display path
+
+    Every array is allocated once and written with `dst=`/in-place operations,
+    and the Tk image is a single PhotoImage that is repainted with `paste()`,
+    so a running preview does not allocate per frame. The pipeline buffers are
+    width x height; only show() scales to display_size(). With display=False no
+    Tk image is created, for use without a window (benchmarks, tools).
+    """
+    def __init__(self, width, height, overlay_color=(0, 0, 255), overlay_alpha=128, display=True):
+        self.width, self.height = width, height
+        shape = (height, width, 3)
+        self.frame = np.empty(shape, dtype=np.uint8)       # resized capture
+        self.annotated = np.empty(shape, dtype=np.uint8)   # detections drawn in place
+        self.composite = np.empty(shape, dtype=np.uint8)   # frame + ROI overlay (BGR)
+        infer_w, infer_h = infer_size(width, height)
+        self.small = np.empty((infer_h, infer_w, 3), dtype=np.uint8)
+        self._blend = np.empty(shape, dtype=np.uint8)
+        self._tint = np.empty(shape, dtype=np.uint8)
+        self._tint[:] = overlay_color
+        self._alpha = overlay_alpha / 255.0
+        self._overlay_where = None
+        self._overlay_rect = None
+        self.photo = None
+        if not display:
+            return
+        self.display_width, self.display_height = display_size(width, height)
+        dw, dh = self.display_width, self.display_height
+        self._scaled = np.empty((dh, dw, 3), dtype=np.uint8) if (dw, dh) != (width, height) else None
+        # RGBA is one of the modes PIL maps without copying, so the PIL image
+        # below is a live view of self._rgba
+        self._rgba = np.zeros((dh, dw, 4), dtype=np.uint8)
+        self._pil = Image.frombuffer('RGBA', (dw, dh), self._rgba, 'raw', 'RGBA', 0, 1)
+        # requires a Tk root; create the renderer after tk.Tk()
+        self.photo = ImageTk.PhotoImage(self._pil)
+
+    def set_overlay(self, mask):
+        """Set the ROI mask used for the semi-transparent overlay"""
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            self._overlay_where = None
+            self._overlay_rect = None
+            return
+        self._overlay_rect = (slice(y, y + h), slice(x, x + w))
+        self._overlay_where = (mask[self._overlay_rect] > 0)[:, :, np.newaxis]
+
+    def resize(self, frame):
+        """Resize a captured frame into the reusable frame buffer (no-op if it already fits)"""
+        if frame.shape[1] == self.width and frame.shape[0] == self.height:
+            return frame
+        return cv2.resize(frame, (self.width, self.height), dst=self.frame)
+
+    def apply_overlay(self, frame, dst=None):
+        """Alpha-blend the ROI overlay onto `frame`, writing into `dst` (defaults to self.composite)"""
+        if dst is None:
+            dst = self.composite
+        if dst is not frame:
+            np.copyto(dst, frame)
+        if self._overlay_where is None:
+            return dst
+        rect = self._overlay_rect
+        blend = self._blend[rect]
+        cv2.addWeighted(frame[rect], 1.0 - self._alpha, self._tint[rect], self._alpha, 0, dst=blend)
+        np.copyto(dst[rect], blend, where=self._overlay_where)
+        return dst
+
+    def show(self, frame):
+        """Paint a BGR frame, scaled to the display size, into the persistent PhotoImage and return it"""
+        if self._scaled is not None:
+            frame = cv2.resize(frame, (self.display_width, self.display_height), dst=self._scaled,
+                               interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        self.photo.paste(self._pil)
+        return self.photo
+
 def process_webcam_gui():
     """Tkinter GUI with mask selector and 720p live preview."""
+    # Thread pools and core pinning must be set before the model and camera start threads
+    apply_resources(config.resources)
     # Load region definitions
     try:
         with open(config.region_json_path, 'r') as f:
@@ -141,6 +368,8 @@ def process_webcam_gui():
     if not models:
         messagebox.showerror("Error", "No mask models found.")
         return
+    # Initialize Serial Communication with Arduino
+    arduino = connect_arduino()
     # Setup main window
     root = tk.Tk()
     root.title("ROI Preview")
@@ -166,6 +395,9 @@ def process_webcam_gui():
     
     ttk.Checkbutton(mask_viz_frame, text="Overlay", variable=overlay_var, style="Small.TCheckbutton").pack(side=tk.LEFT, padx=(5,5))
     ttk.Checkbutton(mask_viz_frame, text="Preview", variable=detect_preview_var, style="Small.TCheckbutton").pack(side=tk.LEFT, padx=5)
+    stats_var = tk.BooleanVar(value=config.metrics_overlay)
+    ttk.Checkbutton(model_frame, text="Stage timings", variable=stats_var, style="Small.TCheckbutton").pack(anchor='w', padx=10, pady=(0,5))
+    stats_var.trace_add('write', lambda *args: (setattr(config, 'metrics_overlay', stats_var.get()), config.save()))
 
     detection_frame = ttk.LabelFrame(ctrl, text="Detection Parameters")
     detection_frame.pack(fill=tk.X, padx=5, pady=(5,5))
@@ -242,9 +474,56 @@ def process_webcam_gui():
     last_signal = None
     current_speed = config.motor_speed
     
-    # Video recording variables
+    # Video recording variables (frames are encoded on the recorder's thread)
     recording = False
-    video_writer = None
+    recorder = None
+    
+    # Per-stage timings and counters for the frame loop
+    metrics = PipelineMetrics(export_dir=config.metrics_dir, export_interval=config.metrics_export_interval)
+    
+    # Structured event journal (written by a background thread)
+    journal = None
+    if config.journal_enabled:
+        try:
+            journal = EventJournal(config.journal_dir, max_bytes=int(config.journal_max_mb * 1024 * 1024),
+                                   max_files=config.journal_max_files)
+        except Exception as e:
+            print(f"[Warning] Event journal disabled: {e}")
+    def log_event(event, **fields):
+        if journal is not None:
+            journal.log(event, **fields)
+    
+    # Optional remote view: MJPEG stream and JSON status over HTTP
+    monitor = None
+    if config.monitor_enabled:
+        try:
+            monitor = MonitorServer(config.monitor_host, config.monitor_port, fps=config.monitor_fps,
+                                    width=config.monitor_width, quality=config.monitor_quality).start()
+        except Exception as e:
+            print(f"[Warning] Monitor server disabled: {e}")
+
+    # On-demand stack sampling (no thread runs until a profile is requested)
+    profiler = SamplingProfiler(config.profiles_dir, interval=config.profile_interval_ms / 1000.0)
+    root.bind('<F9>', lambda event: profiler.toggle(config.profile_seconds))
+    # the signal handler only raises a flag: profiler.start() takes a lock the
+    # interrupted main thread may hold, so the profile is started from update_frame
+    profile_request = {'pending': False}
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profile_request.update(pending=True))
+    if monitor is not None and config.monitor_allow_profile:
+        if config.monitor_host not in ('127.0.0.1', 'localhost', '::1'):
+            print(f"[Warning] /profile is open to anyone who can reach {config.monitor_host}:{config.monitor_port}")
+        def profile_route(query):
+            # blocks this request's thread until the profile is written
+            seconds = min(float(query.get('seconds', [config.profile_seconds])[0]), 300.0)
+            if not profiler.start(seconds):
+                return 'application/json', json.dumps({'error': 'profile already running'}).encode()
+            return 'application/json', json.dumps(profiler.wait(seconds + 30)).encode()
+        monitor.routes['/profile'] = profile_route
+    frame_index = 0
+    detections = []
+    was_detected = False
+    serial_pending = b''
     
     # Define frame variables at the outer scope so they're accessible to all functions
     current_frame = None
@@ -259,30 +538,37 @@ def process_webcam_gui():
         print(f"[GUI] send_and_set called with: {sig}, speed: {speed}")
         if arduino:
             # Format command as sig:speed (e.g., "1:200" for running at speed 200)
-            command = f"{sig}:{speed}\n"
-            arduino.write(command.encode())
+            t = time.perf_counter()
+            command = send_command(arduino, sig, speed)
+            metrics.lap('serial', t)
+            metrics.incr('serial_commands_sent')
+            log_event('serial_tx', cmd=command.strip())
             time.sleep(0.1)
             print(f"[Arduino] Sent {command.strip()}")
         else:
             print(f"[Warning] Arduino not connected. Can't send {sig}:{speed}")
         status_label.config(text=f"Status: {'Running' if sig=='1' else 'Stopped'}")
         last_signal = sig
-    def start_auto():
+    def start_auto(reason='manual'):
         print("[GUI] Start pressed")
         nonlocal running
         running = True
+        log_event('resume', reason=reason, speed=speed_var.get())
         send_and_set('1', speed_var.get())
     def stop_auto():
         print("[GUI] Stop pressed")
         nonlocal running
         running = False
         auto_resume_var.set(False)
+        log_event('stop', reason='manual')
         send_and_set('0', 0)  # Always stop with speed 0
     def pause_auto():
         """Pause on detection without disabling Auto-Resume."""
         print("[GUI] Paused on detection")
         nonlocal running, annotated_frame
         running = False
+        log_event('stop', reason='detection', frame=frame_index,
+                  boxes=[[x1, y1, x2, y2, round(conf, 3)] for x1, y1, x2, y2, conf, in_roi in detections if in_roi])
         send_and_set('0', 0)  # Always stop with speed 0
         
         # Take a screenshot when object is detected and car stops
@@ -292,37 +578,43 @@ def process_webcam_gui():
         
     def start_recording():
         """Start recording video to a file"""
-        nonlocal recording, video_writer
+        nonlocal recording, recorder
         if recording:
             return
             
         # Generate timestamp for filename
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        video_path = os.path.join(config.recordings_dir, f"recording_{timestamp}.mp4")
-        
-        # Create VideoWriter object
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Use mp4v codec
-        video_writer = cv2.VideoWriter(video_path, fourcc, 20.0, (webcam_width, webcam_height))
+        ext = FOURCC_EXTENSIONS.get(config.recording_fourcc, '.mp4')
+        video_path = os.path.join(config.recordings_dir, f"recording_{timestamp}{ext}")
         
-        if video_writer.isOpened():
-            print(f"[Recording] Started: {video_path}")
-            recording = True
-            recording_status.config(text=f"Status: Recording")
-            record_btn.config(state=tk.DISABLED)
-            stop_record_btn.config(state=tk.NORMAL)
-        else:
-            messagebox.showerror("Error", "Failed to create video writer.")
-            video_writer = None
+        # Video plus a per-frame sidecar (boxes, ROI state, motor) for annotating on playback
+        entry = data.get(mask_var.get(), {})
+        header = {'mask': mask_var.get(), 'mask_entry': {k: v for k, v in entry.items() if k != 'meta'},
+                  'conf_threshold': config.conf_threshold, 'overlap_threshold': config.overlap_threshold}
+        try:
+            recorder = Recorder(video_path, loop_fps, (webcam_width, webcam_height),
+                                mode=config.recording_mode, scale=config.recording_scale,
+                                fourcc=config.recording_fourcc, header=header, resources=config.resources,
+                                keyframe_interval=config.recording_keyframe_interval)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to create video writer: {e}")
+            recorder = None
+            return
+        print(f"[Recording] Started ({config.recording_mode}): {video_path}")
+        recording = True
+        recording_status.config(text=f"Status: Recording")
+        record_btn.config(state=tk.DISABLED)
+        stop_record_btn.config(state=tk.NORMAL)
     
     def stop_recording():
         """Stop recording video"""
-        nonlocal recording, video_writer
-        if not recording or video_writer is None:
+        nonlocal recording, recorder
+        if not recording or recorder is None:
             return
             
-        video_writer.release()
-        video_writer = None
         recording = False
+        recorder.close()
+        recorder = None
         print("[Recording] Stopped")
         recording_status.config(text="Status: Not Recording")
         record_btn.config(state=tk.NORMAL)
@@ -351,20 +643,8 @@ def process_webcam_gui():
         
         # Apply overlay to screenshot if overlay is enabled
         if overlay_var.get():
-            # Convert frame to PIL Image for overlay
-            pil_frame = Image.fromarray(cv2.cvtColor(frame_to_save, cv2.COLOR_BGR2RGB)).convert("RGBA")
-            overlay_img = Image.new("RGBA", (webcam_width, webcam_height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay_img)
-            
-            # Draw the polygon overlay
-            regions = data.get(mask_var.get(), {}).get("regions", {})
-            for pts in regions.values():
-                coords = [(x, y) for x, y in pts]
-                draw.polygon(coords, fill=(255, 0, 0, 128))
-            
-            # Composite the image with overlay
-            composite = Image.alpha_composite(pil_frame, overlay_img)
-            frame_with_overlay = cv2.cvtColor(np.array(composite.convert('RGB')), cv2.COLOR_RGB2BGR)
+            # Composite into the renderer's buffer; the display path overwrites it afterwards
+            frame_with_overlay = renderer.apply_overlay(frame_to_save)
             
             # Save the composited image
             cv2.imwrite(screenshot_path, frame_with_overlay)
@@ -374,52 +654,84 @@ def process_webcam_gui():
             
         print(f"[Screenshot] Saved: {screenshot_path}")
 
-    # Video display canvas
-    webcam_width, webcam_height = 1280, 720
-    canvas = tk.Canvas(root, width=webcam_width, height=webcam_height)
+    # Initialize the video source (camera, stream, file or image directory)
+    try:
+        source = open_source(config.video_source, config.capture_width, config.capture_height,
+                             loop=config.video_loop, resources=config.resources, mode=config.camera_mode)
+    except Exception as e:
+        source = None
+        print(f"[Error] {e}")
+    if source is None or not source.isOpened():
+        messagebox.showerror("Error", f"Cannot open video source: {config.video_source}")
+        root.destroy()
+        return
+    # Run the whole pipeline at the mode the source actually delivers
+    webcam_width = source.width or config.capture_width
+    webcam_height = source.height or config.capture_height
+    print(f"[Camera] Capturing from {source.describe()}")
+    # Deadline pacing: detect at target_fps (files no faster than recorded), repaint at display_fps
+    loop_fps = config.target_fps if source.live or not source.fps else min(config.target_fps, source.fps)
+    scheduler = FrameScheduler(loop_fps, config.display_fps, metrics=metrics)
+
+    # Video display canvas: fixed size, the capture-resolution frame is fitted into it
+    canvas = tk.Canvas(root, width=DISPLAY_WIDTH, height=DISPLAY_HEIGHT)
     canvas.pack(side=tk.RIGHT)
+    # reusable frame buffers and the persistent PhotoImage behind img_item
+    renderer = FrameRenderer(webcam_width, webcam_height)
+    capture_buf = None
     # single image item for reuse (avoid creating per frame)
-    img_item = canvas.create_image(0, 0, anchor='nw', image=None)
+    img_item = canvas.create_image(DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2, anchor='center', image=renderer.photo)
     
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, webcam_width)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, webcam_height)
-    if not cap.isOpened():
-        messagebox.showerror("Error", "Cannot open webcam.")
-        root.destroy()
-        return
-    # Build mask for the selected model
-    def build_mask(model_name):
-        regions = data.get(model_name, {}).get("regions", {})
-        m = np.zeros((webcam_height, webcam_width), dtype=np.uint8)
-        for pts in regions.values():
-            poly = np.array(pts, dtype=np.int32)
-            cv2.fillPoly(m, [poly], config.mask_max_value)
-        _, m = cv2.threshold(m, config.mask_threshold, config.mask_max_value, cv2.THRESH_BINARY)
-        return m
-    mask_dict = {'mask': build_mask(mask_var.get())}
+    # Masks are rasterized once per model at the capture resolution
+    masks = MaskCache(data, build=build_mask)
+    indexes = MaskCache(data, build=region_index)
+    def build_model_mask(model_name):
+        return masks.get(model_name, webcam_width, webcam_height)
+    mask_dict = {'mask': build_model_mask(mask_var.get()),
+                 'index': indexes.get(mask_var.get(), webcam_width, webcam_height)}
+    renderer.set_overlay(mask_dict['mask'])
     def on_model_change(*args):
-        mask_dict['mask'] = build_mask(mask_var.get())
+        mask_dict['mask'] = build_model_mask(mask_var.get())
+        mask_dict['index'] = indexes.get(mask_var.get(), webcam_width, webcam_height)
+        renderer.set_overlay(mask_dict['mask'])
     mask_var.trace_add('write', on_model_change)
     # Frame update loop
     model = YOLO(config.model_path)
     def update_frame():
-        nonlocal running, last_signal, current_frame, annotated_frame
-        ret, frame = cap.read()
+        nonlocal running, last_signal, current_frame, annotated_frame, capture_buf
+        nonlocal frame_index, was_detected, serial_pending
+        if profile_request['pending']:
+            profile_request['pending'] = False
+            profiler.start(config.profile_seconds)
+        scheduler.begin_frame()
+        t = metrics.begin_frame()
+        # read into the previous capture buffer so the driver frame is reused
+        ret, frame = source.read(capture_buf)
         if not ret:
+            # keep polling: live sources reconnect in the background, files may just be at the end
+            if source.live:
+                metrics.incr('frames_dropped')
+            root.after(scheduler.next_delay_ms(), update_frame)
             return
+        capture_buf = frame
+        t = metrics.lap('capture', t)
         
-        # Resize the current frame
-        current_frame = cv2.resize(frame, (webcam_width, webcam_height))
+        # Frames already at the pipeline size are used as-is
+        current_frame = renderer.resize(frame)
+        t = metrics.lap('resize', t)
         
         # Determine if we should run inference (for detection, preview or auto-resume)
         do_infer = running or detect_preview_var.get() or auto_resume_var.get()
+        detections.clear()
         if do_infer:
-            annotated_frame, detected = process_frame(current_frame, mask_dict['mask'], model)
+            annotated_frame, detected = process_frame(current_frame, mask_dict['mask'], model,
+                                                      out=renderer.annotated, small=renderer.small,
+                                                      metrics=metrics, detections=detections,
+                                                      index=mask_dict['index'])
         else:
             detected = False
-            annotated_frame = current_frame.copy()  # Ensure annotated_frame exists for screenshots
+            annotated_frame = current_frame  # Ensure annotated_frame exists for screenshots
+            metrics.incr('inferences_skipped')
 
         # Stop on detection if currently running
         if running and detected and last_signal != '0':
@@ -427,53 +739,91 @@ def process_webcam_gui():
 
         # Auto-resume when detection stops
         if auto_resume_var.get() and not detected and last_signal == '0':
-            start_auto()
+            start_auto(reason='auto')
+        
+        # Journal detection transitions, per-frame summaries and Arduino acks
+        frame_index += 1
+        if journal is not None:
+            if detected != was_detected:
+                log_event('detection_start' if detected else 'detection_end', frame=frame_index)
+            if config.journal_frame_every and frame_index % config.journal_frame_every == 0:
+                log_event('frame', frame=frame_index, infer=do_infer, detected=detected, motor=last_signal,
+                          boxes=[[x1, y1, x2, y2, round(conf, 3), int(in_roi)]
+                                 for x1, y1, x2, y2, conf, in_roi in detections])
+            if arduino:
+                lines, serial_pending = read_serial_lines(arduino, serial_pending)
+                for line in lines:
+                    log_event('serial_ack', line=line)
+        was_detected = detected
+        # serial writes above are timed inside send_and_set
+        t = time.perf_counter()
 
         # Choose frame to display: annotated if in running or preview mode, else raw
         if running or detect_preview_var.get():
             frame_out = annotated_frame
         else:
-            frame_out = frame
+            frame_out = current_frame
+        
+        # Painting runs at display_fps and is dropped when behind; detection above always runs
+        render = scheduler.should_render()
         
-        # conditional semi-transparent overlay
+        # conditional semi-transparent overlay, blended in place
         has_overlay = overlay_var.get()
-        if has_overlay:
-            pil_frame = Image.fromarray(cv2.cvtColor(frame_out, cv2.COLOR_BGR2RGB)).convert("RGBA")
-            overlay_img = Image.new("RGBA", (webcam_width, webcam_height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay_img)
-            regions = data.get(mask_var.get(), {}).get("regions", {})
-            for pts in regions.values():
-                coords = [(x, y) for x, y in pts]
-                draw.polygon(coords, fill=(255, 0, 0, 128))
-            composite = Image.alpha_composite(pil_frame, overlay_img)
-            imgtk = ImageTk.PhotoImage(composite)
-            display_frame = np.array(composite.convert('RGB'))
-            display_frame = cv2.cvtColor(display_frame, cv2.COLOR_RGB2BGR)
+        record_display = recording and recorder.mode != 'raw'
+        # remote viewers see the same overlay as the window, so frames due for the stream get it too
+        stream = monitor is not None and monitor.frame_due()
+        if has_overlay and (render or record_display or stream):
+            display_frame = renderer.apply_overlay(frame_out)
         else:
-            pil_frame = Image.fromarray(cv2.cvtColor(frame_out, cv2.COLOR_BGR2RGB))
-            imgtk = ImageTk.PhotoImage(pil_frame)
             display_frame = frame_out
+        t = metrics.lap('overlay', t)
             
-        # Record video if recording is active
-        if recording and video_writer is not None:
-            # Use the same overlay setting as the main display
-            if has_overlay:
-                video_writer.write(display_frame)
-            else:
-                # Always record detected objects in frame
-                if running or detect_preview_var.get():
-                    video_writer.write(annotated_frame)
-                else:
-                    video_writer.write(frame)
+        # Record video if recording is active: raw mode stores the unannotated frame,
+        # annotated mode the displayed one; detections always go to the sidecar
+        if recording and recorder is not None:
+            recorder.write(display_frame if record_display else current_frame,
+                           boxes=[[x1, y1, x2, y2, round(conf, 3), int(in_roi)]
+                                  for x1, y1, x2, y2, conf, in_roi in detections],
+                           detected=int(detected), motor=last_signal, speed=current_speed)
+            t = metrics.lap('recording', t)
+        
+        # Remote viewers get the preview without stage timings; encoding happens off this thread
+        if monitor is not None:
+            if stream:
+                monitor.offer(display_frame)
+            if monitor.status_due():
+                monitor.set_status({'time': time.time(), 'running': running, 'motor': last_signal,
+                                    'speed': current_speed, 'detected': bool(detected), 'mask': mask_var.get(),
+                                    'recording': recording, 'frame': frame_index,
+                                    'journal_dropped': journal.dropped if journal is not None else None,
+                                    'boxes': [[x1, y1, x2, y2, round(conf, 3), int(in_roi)]
+                                              for x1, y1, x2, y2, conf, in_roi in detections],
+                                    'metrics': metrics.snapshot()})
+        
+        if render:
+            # Stage timings are drawn after recording so they stay out of the video
+            if stats_var.get():
+                if display_frame is not renderer.composite:
+                    np.copyto(renderer.composite, display_frame)
+                    display_frame = renderer.composite
+                metrics.draw_overlay(display_frame)
+            renderer.show(display_frame)
+            metrics.lap('display', t)
+        metrics.end_frame()
+        metrics.maybe_export()
         
-        canvas.itemconfig(img_item, image=imgtk)
-        canvas.imgtk = imgtk
-        root.after(30, update_frame)
+        root.after(scheduler.next_delay_ms(), update_frame)
     def on_close():
-        nonlocal recording, video_writer
-        if recording and video_writer is not None:
-            video_writer.release()
-        cap.release()
+        nonlocal recording, recorder
+        if recording and recorder is not None:
+            recorder.close()
+        source.release()
+        if monitor is not None:
+            monitor.stop()
+        profiler.stop()
+        metrics.export()
+        if journal is not None:
+            journal.close()
         config.save()
         root.destroy()
     # Function to apply current speed without changing run state